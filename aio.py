@@ -0,0 +1,27 @@
+import asyncio
+from typing import List
+
+from tenant.tenant import Tenant, open_results, close_results
+from service.server import AsyncCacheServer
+from service.scheme import CacheScheme, BackingStoreScheme
+
+
+async def replay(tenants: List[Tenant], cache_scheme: CacheScheme, backingstore_scheme: BackingStoreScheme):
+    """ replay all tenants as coroutines on one event loop; each request is
+    woken by loop.call_at at its trace ts; return the server """
+    svr = AsyncCacheServer(cache_scheme=cache_scheme,
+                           backingstore_scheme=backingstore_scheme)
+    await svr.reset()
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    await asyncio.gather(*[tnt.arun(svr, loop, t0) for tnt in tenants])
+    return svr
+
+
+def main(tenants: List[Tenant], cache_scheme: CacheScheme, backingstore_scheme: BackingStoreScheme, dst: str):
+    sink = open_results(tenants, dst)
+    svr = asyncio.run(replay(tenants, cache_scheme, backingstore_scheme))
+    close_results(tenants, sink)
+    print("reclaimed by ttl:", dict(svr.cache_client.allocator.reclaimed))
+    svr.save_latency(dst)
+    svr.cache_client.allocator.save_metrics(dst)
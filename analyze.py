@@ -1,32 +1,33 @@
 import os
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+from multiprocessing import Pool
 
 WINDOW_SIZE = 5
 
 
 def compare_tnts(df, dst):
-    tnts = set(df["tntid"])
+    tnts = dict(list(df.groupby("tntid")))
 
     fig, axs = plt.subplots(2, 2, figsize=(12, 6))
 
     # respective tps
-    # for t in tnts:
-    #     d = df[df["tntid"] == t]
+    # for t, d in tnts.items():
     #     x, y = get_tps(d)
     #     axs[0, 0].plot(x, y, label=t, marker='o')
     # axs[0, 0].set_title('Respective Throughput')
 
     # respective lats
-    for t in tnts:
-        d = df[df["tntid"] == t]
+    for t, d in tnts.items():
         x, y = get_lats(d)
         axs[0, 0].plot(x, y, label=t, marker='o')
     axs[0, 0].set_title('Respective Latencies')
 
     # respective hrs
-    for t in tnts:
-        d = df[df["tntid"] == t]
+    for t, d in tnts.items():
         x, y = get_hrs(d)
         axs[0, 1].plot(x, y, label=t, marker='o')
     axs[0, 1].set_title('Respective Hit Rates')
@@ -51,38 +52,114 @@ def compare_tnts(df, dst):
     plt.savefig(dst)
 
 
+def _windows(df, ws):
+    """ per-second window ends t and the row ranges [lo, hi) of df sorted by
+    finish_ts that fall in (t-ws, t] """
+    df = df.sort_values("finish_ts")
+    finish = df["finish_ts"].to_numpy()
+    ts = np.arange(int(finish.max()) + 2)
+    hi = np.searchsorted(finish, ts, side="right")
+    lo = np.searchsorted(finish, ts - ws, side="right")
+    return df, ts, lo, hi
+
+
+def _window_sums(values, lo, hi):
+    csum = np.concatenate([[0], np.cumsum(values, dtype=np.float64)])
+    return csum[hi] - csum[lo]
+
+
 def get_tps(df, ws=WINDOW_SIZE):
-    max_t = df["finish_ts"].max()
-    ts = [t for t in range(int(max_t)+2)]
-    tps = []
-    for t in ts:
-        d = df[(t-ws < df["finish_ts"]) & (df["finish_ts"] <= t)]
-        tp = d.count()/ws
-        tps.append(tp)
-    return ts, tps
+    df, ts, lo, hi = _windows(df, ws)
+    tps = (hi - lo) / ws
+    return list(ts), list(tps)
 
 
 def get_lats(df, ws=WINDOW_SIZE):
-    max_t = df["finish_ts"].max()
-    ts = [t for t in range(int(max_t)+2)]
-    lats = []
-    for t in ts:
-        d = df[(t-ws < df["finish_ts"]) & (df["finish_ts"] <= t)]
-        lat = (d["finish_ts"]-d["issue_ts"]).mean()
-        lats.append(lat)
-    return ts, lats
+    df, ts, lo, hi = _windows(df, ws)
+    lat = (df["finish_ts"] - df["issue_ts"]).to_numpy()
+    cnt = hi - lo
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lats = _window_sums(lat, lo, hi) / cnt
+    lats[cnt == 0] = np.nan
+    return list(ts), list(lats)
 
 
 def get_hrs(df, ws=WINDOW_SIZE):
-    max_t = df["finish_ts"].max()
-    ts = [t for t in range(int(max_t)+2)]
-    hrs = []
-    for t in ts:
-        d = df[(t-ws < df["finish_ts"]) & (df["finish_ts"] <= t)]
-        h = d[d["hit"] == True].count()/ws
-        hrs.append(h)
-        print(h)
-    return ts, hrs
+    df, ts, lo, hi = _windows(df, ws)
+    hrs = _window_sums(df["hit"].to_numpy() == True, lo, hi) / ws
+    return list(ts), list(hrs)
+
+
+def plot_mrc(df, dst):
+    """ per-tenant miss-ratio curves, as written by mrc.py """
+    fig, ax = plt.subplots(figsize=(6, 4))
+    for t, d in df.groupby("tntid"):
+        ax.plot(d["cache_size"], d["miss_ratio"], label=t)
+    ax.set_xlabel('Cache Size (objects)')
+    ax.set_ylabel('Miss Ratio')
+    ax.set_title('Miss Ratio Curves')
+    ax.legend(fontsize="small")
+    plt.tight_layout()
+    plt.savefig(dst)
+
+
+def plot_latency(df, dst):
+    """ mean time per request phase of each tenant, from a *_latency.csv """
+    means = df.pivot(index="tntid", columns="phase", values="mean_us")
+    fig, ax = plt.subplots(figsize=(8, 4))
+    means.plot.bar(stacked=True, ax=ax)
+    ax.set_ylabel('Mean Time (us)')
+    ax.set_title('Request Latency Breakdown')
+    plt.tight_layout()
+    plt.savefig(dst)
+
+
+def plot_occupancy(df, dst):
+    """ share of the cache each tenant holds over time, from a *_occupancy.csv """
+    used = df.pivot(index="ts", columns="tntid", values="used")
+    share = used.div(used.sum(axis=1).replace(0, np.nan), axis=0)
+    fig, ax = plt.subplots(figsize=(8, 4))
+    share.plot(ax=ax)
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Share of Used Capacity')
+    ax.set_title('Cache Occupancy')
+    ax.legend(fontsize="small")
+    plt.tight_layout()
+    plt.savefig(dst)
+
+
+def plot_decisions(df, dst):
+    """ eviction path counts and mean scan lengths, from a *_decisions.csv """
+    fig, axs = plt.subplots(1, 2, figsize=(12, 4))
+    counts = df[df["kind"] == "count"]
+    axs[0].bar(counts["metric"], counts["count"])
+    axs[0].set_title('Decision Counts')
+    axs[0].tick_params(axis="x", labelrotation=30)
+    scans = df[df["kind"] == "scan"]
+    axs[1].bar(scans["metric"], scans["mean"], label="mean")
+    axs[1].scatter(scans["metric"], scans["p99"], color="black", label="p99")
+    axs[1].set_title('Scan Lengths')
+    axs[1].tick_params(axis="x", labelrotation=30)
+    axs[1].legend(fontsize="small")
+    plt.tight_layout()
+    plt.savefig(dst)
+
+
+def plot_file(path):
+    df = pd.read_csv(path)
+    if "phase" in df.columns:
+        plot = plot_latency
+    elif "miss_ratio" in df.columns:
+        plot = plot_mrc
+    elif "metric" in df.columns:
+        plot = plot_decisions
+    elif "used" in df.columns:
+        plot = plot_occupancy
+    else:
+        plot = compare_tnts
+    plot(df, path.replace(".csv", ".png"))
+    plt.close("all")
+    return path
 
 
 # if __name__ == "__main__":
@@ -90,14 +167,18 @@ def get_hrs(df, ws=WINDOW_SIZE):
 #     df = pd.read_csv(path)
 #     compare_tnts(df, path.replace(".csv", ".png"))
 if __name__ == "__main__":
-    folder = "/home/yunchi/582/resalloc/results"
+    folder = "results"
     skip_exists = False
 
-    for file in os.listdir(folder):
-        path = os.path.join(folder, file)
-        if path.endswith(".png"):
-            continue
-        if os.path.exists(path.replace(".csv", ".png")) and skip_exists:
-            continue
-        df = pd.read_csv(path)
-        compare_tnts(df, path.replace(".csv", ".png"))
+    paths = []
+    for root, _, files in os.walk(folder):
+        for file in files:
+            path = os.path.join(root, file)
+            if not path.endswith(".csv"):
+                continue
+            if os.path.exists(path.replace(".csv", ".png")) and skip_exists:
+                continue
+            paths.append(path)
+    with Pool() as pool:
+        for path in pool.imap_unordered(plot_file, paths):
+            print(path)
@@ -0,0 +1,17 @@
+# defaults copied into every CacheScheme; override per scheme if needed
+REDIS_HOST = "localhost"
+REDIS_PORT = 6379
+REDIS_DB = 0
+REDIS_POOL_SIZE = 16  # connections shared by all tenant threads
+KEY_LOCK_STRIPES = 64  # stripes ordering storage I/O per key
+PAYLOAD_BUFFER_BYTES = 1 << 20  # random buffer that "slice" values are cut from
+RESULT_CHUNK_ROWS = 1 << 16  # rows per tenant buffered before flushing results
+DISPATCH_WORKERS = 32  # threads issuing requests in threaded replay
+TTL_TICK = 1.0  # seconds per slot of the allocators' expiry timing wheel
+SLAB_MIN_CHUNK = 96  # smallest slab chunk in bytes, as memcached's default
+SLAB_MAX_CHUNK = 1 << 20  # largest slab chunk, one slab page
+SLAB_GROWTH_FACTOR = 1.25  # chunk size ratio between neighbouring slab classes
+LATENCY_BREAKDOWN = False  # record per-tenant lock/allocator/genval/storage time histograms
+ALLOCATOR_METRICS = False  # count allocator decisions and sample per-tenant occupancy
+OCCUPANCY_SAMPLES = 4096  # occupancy samples kept, oldest overwritten first
+OCCUPANCY_INTERVAL = 1.0  # seconds of scheme.clock between occupancy samples
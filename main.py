@@ -1,12 +1,17 @@
 import os
 import time
-import threading
-import pandas as pd
-from typing import List, Dict, Tuple
+from typing import List
 
-from tenant.tenant import Tenant
+import sim
+import aio
+import config
+from tenant.tenant import Tenant, open_results, close_results
+from tenant.recorder import ResultSink
+from tenant.trace import Trace, load_trace
+from tenant.dispatcher import Dispatcher
 from service.server import CacheServer
 from service.scheme import CacheScheme, BackingStoreScheme
+from service.allocator.slab import SlabClasses, create_slab_classes
 from service.allocator.global_pooled_lru import GlobalPooledLRU
 from service.allocator.maxmin import Maxmin
 from service.allocator.amshare import AMShare
@@ -14,66 +19,117 @@ from service.allocator.memshare import Memshare
 
 
 def parse_tenants(df) -> List[Tenant]:
-    tenant_queries: Dict[List[Tuple[float, str]]] = {}
-    for _, row in df.iterrows():
-        ts = row["ts"]
-        tntid = row["tntid"]
-        key = row["key"]
-        val_size = row["val_size"]
-        op = row["op"]
-        ttl = row["ttl"]
-        if tntid not in tenant_queries:
-            tenant_queries[tntid] = []
-        tenant_queries[tntid].append((ts, key, val_size, op, ttl))
-
-    tenants: List[Tenant] = []
-    for tntid in tenant_queries:
-        queries = sorted(tenant_queries[tntid], key=lambda x: x[0])
-        tss = [q[0] for q in queries]
-        keys = [q[1] for q in queries]
-        val_sizes = [q[2] for q in queries]
-        ops = [q[3] for q in queries]
-        ttls = [q[4] for q in queries]
-        tnt = Tenant(tntid=tntid, time_series=tss, query_keys=keys,
-                     val_sizes=val_sizes, ops=ops, ttls=ttls)
-        tenants.append(tnt)
-    return tenants
+    return Trace.from_df(df).tenants()
 
 
 def main(tenants: List[Tenant], cache_scheme: CacheScheme, backingstore_scheme: BackingStoreScheme, dst: str):
     svr = CacheServer(cache_scheme=cache_scheme,
                       backingstore_scheme=backingstore_scheme)
-    threads = []
-    t0 = time.time()
-    for tnt in tenants:
-        t = threading.Thread(target=tnt.run, args=[svr, t0])
-        t.start()
-        threads.append(t)
-    for t in threads:
-        t.join()
-    df = None
-    for tnt in tenants:
-        tnt_df = tnt.dump_result()
-        if df is None:
-            df = tnt_df
-        else:
-            df = pd.concat([df, tnt_df], ignore_index=True)
-
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
-    df.to_csv(dst, index=False)
+    sink = open_results(tenants, dst)
+    dispatcher = Dispatcher(tenants, svr, config.DISPATCH_WORKERS)
+    dispatcher.run(t0=time.time())
+    close_results(tenants, sink)
+    print("issue lag:", dispatcher.lag_summary())
+    print("reclaimed by ttl:", dict(svr.cache_client.allocator.reclaimed))
+    svr.save_latency(dst)
+    svr.cache_client.allocator.save_metrics(dst)
 
 
 def get_trace_name(trace_file: str) -> str:
     return os.path.splitext(os.path.basename(trace_file))[0]
 
 
-def setup_cache_size(trace_df, cache_ratio) -> int:
-    num_keys = len(trace_df[["key", "tntid"]].drop_duplicates())
-    cache_size = int(num_keys * cache_ratio)
+def setup_cache_size(trace: Trace, cache_ratio, capacity="objects", slabs: SlabClasses = None) -> int:
+    """ cache_ratio of the trace's footprint: its unique keys, or the bytes
+    they take with capacity "bytes" / "slabs" """
+    if capacity == "objects":
+        footprint = trace.num_unique_keys()
+    elif capacity == "bytes":
+        footprint = int(trace.pair_sizes().sum())
+    else:
+        footprint = sum(slabs.chunk_size(int(s)) for s in trace.pair_sizes())
+    cache_size = int(footprint * cache_ratio)
     print("cache size:", cache_size)
     return cache_size
 
 
+def get_result_path(trace_file, latency_mu, cache_ratio, allocator_class, capacity="objects",
+                    latency_sigma=0, replay="threads") -> str:
+    """ defaults keep the plain results/lat{mu}_cr{ratio}/ layout; any other
+    sigma, replay or capacity is added to the directory name """
+    suffix = "" if latency_sigma == 0 else f"_sig{latency_sigma}"
+    suffix += "" if replay == "threads" else f"_{replay}"
+    suffix += "" if capacity == "objects" else f"_{capacity}"
+    return f"results/lat{latency_mu}_cr{cache_ratio}{suffix}/{get_trace_name(trace_file)}_{allocator_class.__name__}.csv"
+
+
+# "threads": wall-clock replay, dispatcher thread + worker pool (main above)
+# "async": wall-clock replay, one coroutine per tenant (aio.py)
+# "sim": virtual-clock replay (sim.py)
+REPLAYS = {
+    "threads": main,
+    "async": aio.main,
+    "sim": sim.main,
+}
+
+
+def setup_cache_scheme(trace: Trace, cache_ratio, allocator_class, wrapped_keys=None,
+                       scheme_overrides=None, capacity="objects") -> CacheScheme:
+    cscheme = CacheScheme(
+        cache_ratio=cache_ratio,
+        cache_size=None,
+        num_tenants=len(trace.tntids),
+        allocator_class=allocator_class)
+    cscheme.wrapped_keys = wrapped_keys
+    cscheme.num_keys = trace.num_unique_keys()  # trace.tenants() is interned
+    cscheme.capacity = capacity
+    for attr, value in (scheme_overrides or {}).items():
+        setattr(cscheme, attr, value)
+    cscheme.cache_size = setup_cache_size(trace, cache_ratio, cscheme.capacity,
+                                          create_slab_classes(cscheme))
+    return cscheme
+
+
+def run_experiment(trace: Trace, trace_file: str, latency_mu, latency_sigma, cache_ratio, allocator_class,
+                   replay="threads", wrapped_keys=None, scheme_overrides=None, capacity="objects") -> str:
+    """ replay trace once; scheme_overrides are set on the CacheScheme,
+    e.g. {"storage": "dict"}; capacity is the unit of cache_size, see
+    CacheScheme.capacity; return result csv path """
+    tenants = trace.tenants()
+    cscheme = setup_cache_scheme(trace, cache_ratio, allocator_class, wrapped_keys,
+                                 scheme_overrides, capacity)
+    bscheme = BackingStoreScheme(
+        latency_mu=latency_mu,
+        latency_sigma=latency_sigma)
+    dst = get_result_path(trace_file, latency_mu, cache_ratio, allocator_class, cscheme.capacity,
+                          latency_sigma, replay)
+    REPLAYS[replay](tenants, cscheme, bscheme, dst)
+    return dst
+
+
+def run_lockstep(trace: Trace, trace_file: str, latency_mu, latency_sigma, cache_ratio, allocator_classes,
+                 scheme_overrides=None, capacity="objects") -> List[str]:
+    """ replay trace once on a virtual clock through all allocator_classes
+    in lockstep, without storage; return their result csv paths """
+    cscheme = setup_cache_scheme(trace, cache_ratio, allocator_classes[0],
+                                 scheme_overrides=scheme_overrides, capacity=capacity)
+    bscheme = BackingStoreScheme(
+        latency_mu=latency_mu,
+        latency_sigma=latency_sigma)
+    replay = sim.lockstep(trace.tenants(), cscheme, allocator_classes, bscheme)
+    frames = replay.frames()
+    dsts = []
+    for allocator in replay.allocators:
+        dst = get_result_path(trace_file, latency_mu, cache_ratio, type(allocator), cscheme.capacity,
+                              latency_sigma, "lockstep")
+        sink = ResultSink(dst)
+        sink.write(frames[type(allocator)])
+        sink.close()
+        allocator.save_metrics(dst)
+        dsts.append(dst)
+    return dsts
+
+
 if __name__ == "__main__":
     # trace_file = "/home/yunchi/582/resalloc/data/trace/selected_data_tenant10_time0-60_iter0.csv"
     # trace_file = "/home/yunchi/582/resalloc/data/trace/selected_data_tenant2_time0-10_iter0.csv"
@@ -82,20 +138,17 @@ if __name__ == "__main__":
     trace_file = "data/trace/selected_data_tenant2_time0-900_iter1.csv"
     # trace_file = "/home/yunchi/582/resalloc/data/trace/selected_data_tenant50_time0-900_iter0.csv"
     latency_sigma = 0
+    replay = "threads"  # one of REPLAYS, or "lockstep" for all allocators in one virtual-clock pass
+    capacity = "objects"  # "bytes" or "slabs" to budget cache_size in bytes; pair "slabs" with SlabShare
+    trace = load_trace(trace_file)
+    wrapped_keys = trace.wrapped_keys()
+    allocator_classes = [GlobalPooledLRU, Maxmin, AMShare, Memshare]
     for latency_mu in [3]:
         for cache_ratio in [0.5]:
-            for allocator_class in [GlobalPooledLRU, Maxmin, AMShare, Memshare]:
-
-                trace_df = pd.read_csv(trace_file)
-                tenants = parse_tenants(trace_df)
-
-                cscheme = CacheScheme(
-                    cache_ratio=cache_ratio,
-                    cache_size=setup_cache_size(trace_df, cache_ratio),
-                    num_tenants=len(tenants),
-                    allocator_class=allocator_class)
-                bscheme = BackingStoreScheme(
-                    latency_mu=latency_mu,
-                    latency_sigma=latency_sigma)
-                dst = f"results/lat{latency_mu}_cr{cache_ratio}/{get_trace_name(trace_file)}_{allocator_class.__name__}.csv"
-                main(tenants, cscheme, bscheme, dst)
+            if replay == "lockstep":
+                run_lockstep(trace, trace_file, latency_mu, latency_sigma, cache_ratio, allocator_classes,
+                             capacity=capacity)
+                continue
+            for allocator_class in allocator_classes:
+                run_experiment(trace, trace_file, latency_mu, latency_sigma, cache_ratio, allocator_class,
+                               replay=replay, wrapped_keys=wrapped_keys, capacity=capacity)
@@ -0,0 +1,107 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import List
+
+from tenant.trace import Trace, load_trace
+
+SHARDS_MODULUS = 1 << 24
+MRC_POINTS = 100  # cache sizes per tenant curve
+
+
+class Fenwick:
+    """ binary indexed tree of counts over positions [0, n) """
+
+    def __init__(self, n) -> None:
+        self.n = n
+        self.tree: List[int] = [0] * (n + 1)
+
+    def add(self, i, delta) -> None:
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i) -> int:
+        """ sum over positions [0, i) """
+        s = 0
+        while i > 0:
+            s += self.tree[i]
+            i -= i & -i
+        return s
+
+
+def reuse_distances(keys) -> np.ndarray:
+    """ LRU stack distance of every access: number of distinct keys used
+    since the previous access to the same key, -1 on first access.
+    each key marks the position of its latest access, so the distance is
+    the number of marks after the previous one """
+    bit = Fenwick(len(keys))
+    last = {}
+    dists = np.empty(len(keys), dtype=np.int64)
+    for i, k in enumerate(keys.tolist()):
+        p = last.get(k)
+        if p is None:
+            dists[i] = -1
+        else:
+            dists[i] = len(last) - bit.prefix(p + 1)
+            bit.add(p, -1)
+        bit.add(i, 1)
+        last[k] = i
+    return dists
+
+
+def shards_sample(keys, sample_rate) -> np.ndarray:
+    """ SHARDS spatial sampling: keep every access to keys whose hash falls
+    under sample_rate, so each sampled key keeps its full reuse pattern """
+    h = (np.asarray(keys, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(40)
+    return h % SHARDS_MODULUS < round(sample_rate * SHARDS_MODULUS)
+
+
+def miss_ratio_curve(keys, sample_rate=1.0, num_points=MRC_POINTS):
+    """ return (cache sizes in objects, LRU miss ratios) of one access stream;
+    with sample_rate < 1, distances of the SHARDS sample are scaled up """
+    if sample_rate < 1:
+        keys = keys[shards_sample(keys, sample_rate)]
+    if len(keys) == 0:
+        return np.zeros(1, dtype=np.int64), np.ones(1)
+    dists = reuse_distances(keys)
+    cold = np.count_nonzero(dists < 0)
+    reuse = np.sort(dists[dists >= 0] / sample_rate)
+    max_size = int(np.ceil(cold / sample_rate))  # (estimated) distinct keys
+    sizes = np.unique(np.linspace(0, max_size, num_points).astype(np.int64))
+    # a hit at size c needs distance < c
+    misses = cold + len(reuse) - np.searchsorted(reuse, sizes, side="left")
+    return sizes, misses / len(keys)
+
+
+def as_trace(src) -> Trace:
+    """ trace from a csv path, as main loads it, or a DataFrame, as parse_tenants takes """
+    if isinstance(src, str):
+        return load_trace(src)
+    return Trace.from_df(src)
+
+
+def tenant_mrcs(src, sample_rate=1.0, num_points=MRC_POINTS) -> pd.DataFrame:
+    """ per-tenant LRU miss-ratio curves in one pass over each tenant's
+    requests; columns tntid, cache_size (objects), miss_ratio """
+    frames = []
+    for tnt in as_trace(src).tenants():
+        sizes, mrs = miss_ratio_curve(np.asarray(tnt.query_keys), sample_rate, num_points)
+        frames.append(pd.DataFrame({"tntid": tnt.tntid, "cache_size": sizes, "miss_ratio": mrs}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_mrc_path(trace_file, sample_rate=1.0) -> str:
+    name = os.path.splitext(os.path.basename(trace_file))[0]
+    suffix = "" if sample_rate >= 1 else f"_shards{sample_rate}"
+    return f"results/mrc/{name}{suffix}.csv"
+
+
+if __name__ == "__main__":
+    trace_file = "data/trace/selected_data_tenant10_time0-900_iter0.csv"
+    sample_rate = 1.0  # e.g. 0.01 for SHARDS on large traces
+    dst = get_mrc_path(trace_file, sample_rate)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tenant_mrcs(trace_file, sample_rate).to_csv(dst, index=False)
+    print(dst)
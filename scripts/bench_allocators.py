@@ -0,0 +1,198 @@
+"""
+Decision speed and metadata size of every allocator, driven only through
+Allocator.access on a virtual clock (no storage, no threads).
+
+For each allocator and cache size, the allocator is built and filled with
+distinct keys under tracemalloc (bytes per entry), then a synthetic workload runs
+against it, timing every access (ops/s and per-call percentiles):
+  zipf  - one tenant, Zipf(ZIPF_ALPHA) over 2x cache size keys
+  scan  - one tenant cycling over 1.5x cache size keys, all misses under LRU
+  skew  - SKEW_TENANTS tenants, Zipf-skewed request shares and key popularity
+The checked-in traces in data/trace are replayed once at TRACE_CACHE_RATIO.
+
+run from repo root: python -m scripts.bench_allocators [--sizes 1000 10000 ...]
+"""
+import os
+import time
+import argparse
+import tracemalloc
+from array import array
+
+import numpy as np
+import pandas as pd
+
+import sim
+from tenant.trace import load_trace
+from service.scheme import CacheScheme
+from service.lockstep import VirtualClock
+from service.allocator.global_pooled_lru import GlobalPooledLRU
+from service.allocator.maxmin import Maxmin
+from service.allocator.amshare import AMShare
+from service.allocator.memshare import Memshare
+from service.allocator.slabshare import SlabShare
+
+ALLOCATORS = [GlobalPooledLRU, Maxmin, AMShare, Memshare, SlabShare]
+SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+OPS = 200_000  # timed accesses per (allocator, size, workload)
+ZIPF_ALPHA = 0.99
+SKEW_TENANTS = 10
+TRACE_FILES = ["data/trace/selected_data_tenant10_time0-900_iter0.csv",
+               "data/trace/selected_data_tenant50_time0-60_iter0.csv",
+               "data/trace/cluster_01.000_tenant5_time0-900.csv"]
+TRACE_CACHE_RATIO = 0.3
+VAL_SIZE = 1024
+
+
+def zipf_keys(rng, n, num_keys, alpha=ZIPF_ALPHA):
+    """ approximate bounded Zipf by inverting the continuous cdf """
+    u = rng.random(n)
+    if alpha == 1:
+        return np.minimum((num_keys ** u).astype(np.int64) - 1, num_keys - 1)
+    a = 1 - alpha
+    return np.minimum(((u * (num_keys ** a - 1) + 1) ** (1 / a)).astype(np.int64) - 1, num_keys - 1)
+
+
+def zipf_workload(rng, n, cache_size):
+    return np.zeros(n, dtype=np.int64), zipf_keys(rng, n, 2 * cache_size)
+
+
+def scan_workload(rng, n, cache_size):
+    # starts right after the keys fill() inserted
+    return np.zeros(n, dtype=np.int64), (cache_size + np.arange(n, dtype=np.int64)) % int(1.5 * cache_size)
+
+
+def skew_workload(rng, n, cache_size):
+    tntids = zipf_keys(rng, n, SKEW_TENANTS, alpha=1.2)
+    keys = np.empty(n, dtype=np.int64)
+    per_tenant = max(1, 2 * cache_size // SKEW_TENANTS)
+    for t in range(SKEW_TENANTS):
+        mask = tntids == t
+        keys[mask] = zipf_keys(rng, np.count_nonzero(mask), per_tenant, alpha=0.7 + 0.06 * t)
+    return tntids, keys
+
+
+WORKLOADS = {
+    "zipf": zipf_workload,
+    "scan": scan_workload,
+    "skew": skew_workload,
+}
+
+
+def make_allocator(allocator_class, cache_size, num_tenants, num_keys=None):
+    """ num_keys: keys are then ints below it, one range across tenants """
+    scheme = CacheScheme(cache_ratio=None, cache_size=cache_size,
+                         num_tenants=num_tenants, allocator_class=allocator_class)
+    scheme.clock = VirtualClock()
+    scheme.num_keys = num_keys
+    return allocator_class(scheme=scheme)
+
+
+def fill(allocator_class, cache_size, num_tenants, num_keys=None):
+    """ build an allocator and insert cache_size distinct keys; return it
+    and the bytes per entry traced for both, so arrays sized up front
+    (e.g. DenseEntryStore.slot_of) count too """
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    allocator = make_allocator(allocator_class, cache_size, num_tenants, num_keys)
+    for i in range(cache_size):
+        allocator.scheme.clock.now = i * 1e-6
+        allocator.access(i % num_tenants, i // num_tenants, 0, VAL_SIZE)
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return allocator, used / cache_size
+
+
+def drive(allocator, ts, tntids, keys, ttls=None, val_sizes=None, iswrites=None) -> dict:
+    """ time every access; return ops/s, hit ratio and latency percentiles """
+    clock = allocator.scheme.clock
+    lats = array("q")
+    hits = 0
+    perf_ns = time.perf_counter_ns
+    ts, tntids, keys = ts.tolist(), tntids.tolist(), keys.tolist()
+    ttls = [0] * len(keys) if ttls is None else ttls.tolist()
+    val_sizes = [VAL_SIZE] * len(keys) if val_sizes is None else val_sizes.tolist()
+    iswrites = [False] * len(keys) if iswrites is None else iswrites.tolist()
+    for t, tntid, key, ttl, val_size, iswrite in zip(ts, tntids, keys, ttls, val_sizes, iswrites):
+        clock.now = t
+        t0 = perf_ns()
+        hit, _, _ = allocator.access(tntid, key, ttl, val_size, iswrite)
+        lats.append(perf_ns() - t0)
+        hits += hit
+    lat = np.frombuffer(lats, dtype=np.int64)
+    return {
+        "ops_per_s": len(lat) / (lat.sum() / 1e9),
+        "hit_ratio": hits / len(lat),
+        "p50_us": np.percentile(lat, 50) / 1e3,
+        "p99_us": np.percentile(lat, 99) / 1e3,
+        "p999_us": np.percentile(lat, 99.9) / 1e3,
+        "max_us": lat.max() / 1e3,
+    }
+
+
+def bench_synthetic(allocator_class, cache_size, workload, ops, seed=0) -> dict:
+    num_tenants = SKEW_TENANTS if workload == "skew" else 1
+    # skew reuses key ints across tenants, so only one tenant's keys are dense
+    num_keys = None if num_tenants > 1 else 2 * cache_size
+    allocator, bytes_per_entry = fill(allocator_class, cache_size, num_tenants, num_keys)
+    tntids, keys = WORKLOADS[workload](np.random.default_rng(seed), ops, cache_size)
+    ts = cache_size * 1e-6 + np.arange(ops) * 1e-6
+    row = drive(allocator, ts, tntids, keys)
+    row["bytes_per_entry"] = bytes_per_entry
+    return row
+
+
+def bench_trace(allocator_class, trace_file) -> dict:
+    trace = load_trace(trace_file)
+    tenants = trace.tenants()
+    order = list(sim.merge_requests(tenants))
+    cache_size = max(1, int(trace.num_unique_keys() * TRACE_CACHE_RATIO))
+    allocator = make_allocator(allocator_class, cache_size, len(tenants), trace.num_unique_keys())
+    pick = lambda col: np.array([getattr(tenants[n], col)[i] for _, n, i in order])
+    row = drive(allocator, np.array([ts for ts, _, _ in order]),
+                np.array([tenants[n].tntid for _, n, _ in order]), pick("query_keys"),
+                pick("ttls"), pick("val_sizes"), pick("ops") != "get")
+    row["cache_size"] = cache_size
+    return row
+
+
+def run(sizes, ops, workloads, allocator_classes, trace_files) -> pd.DataFrame:
+    rows = []
+    for allocator_class in allocator_classes:
+        for cache_size in sizes:
+            for workload in workloads:
+                row = bench_synthetic(allocator_class, cache_size, workload, ops)
+                row.update(allocator=allocator_class.__name__, workload=workload, cache_size=cache_size)
+                print(format_row(row), flush=True)
+                rows.append(row)
+        for trace_file in trace_files:
+            row = bench_trace(allocator_class, trace_file)
+            row.update(allocator=allocator_class.__name__,
+                       workload=os.path.splitext(os.path.basename(trace_file))[0])
+            print(format_row(row), flush=True)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def format_row(row) -> str:
+    mem = f"{row['bytes_per_entry']:>8.0f}" if "bytes_per_entry" in row else f"{'-':>8}"
+    return (f"{row['allocator']:>16} {row['workload'][:32]:>32} {row['cache_size']:>9} "
+            f"{row['ops_per_s']:>10.0f} {row['hit_ratio']:>6.3f} {row['p50_us']:>8.2f} "
+            f"{row['p99_us']:>8.2f} {row['p999_us']:>9.2f} {mem}")
+
+
+if __name__ == "__main__":
+    names = {cls.__name__: cls for cls in ALLOCATORS}
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--ops", type=int, default=OPS)
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument("--allocators", nargs="+", default=list(names), choices=list(names))
+    parser.add_argument("--traces", nargs="*", default=TRACE_FILES)
+    parser.add_argument("--dst", help="also write the table to this csv")
+    args = parser.parse_args()
+
+    print(f"{'allocator':>16} {'workload':>32} {'size':>9} {'ops/s':>10} {'hit':>6} "
+          f"{'p50 us':>8} {'p99 us':>8} {'p99.9 us':>9} {'B/entry':>8}")
+    df = run(args.sizes, args.ops, args.workloads, [names[a] for a in args.allocators], args.traces)
+    if args.dst:
+        df.to_csv(args.dst, index=False)
@@ -0,0 +1,78 @@
+"""
+Throughput of CacheClient.handle as tenant threads are added.
+
+Storage is an in-process dict with a fixed sleep per operation standing in
+for a network round trip. "serial" holds the allocator lock across I/O, as
+CacheClient used to; "striped" is the current CacheClient.
+
+run from repo root: python -m scripts.bench_contention
+"""
+import time
+import random
+import threading
+
+from service.client import CacheClient
+from service.scheme import CacheScheme
+from service.storage import DictStorage
+from service.allocator.global_pooled_lru import GlobalPooledLRU
+
+RTT = 0.0005  # seconds per storage operation
+REQS_PER_TENANT = 400
+NUM_KEYS = 1000
+
+
+class RTTStorage(DictStorage):
+    def get(self, wk):
+        time.sleep(RTT)
+        return super().get(wk)
+
+    def set(self, wk, val):
+        time.sleep(RTT)
+        super().set(wk, val)
+
+    def delete(self, wk):
+        time.sleep(RTT)
+        super().delete(wk)
+
+    def replace(self, evict_wks, wk, val):
+        time.sleep(RTT)  # pipelined: one round trip
+        for evict_wk in evict_wks:
+            super().delete(evict_wk)
+        super().set(wk, val)
+
+
+class SerialCacheClient(CacheClient):
+    def handle(self, tntid, key, val, iswrite, ttl, val_size) -> bool:
+        with self.lock:
+            return super().handle(tntid, key, val, iswrite, ttl, val_size)
+
+
+def run(client_class, num_tenants) -> float:
+    scheme = CacheScheme(cache_ratio=0.5, cache_size=NUM_KEYS * num_tenants // 2,
+                         num_tenants=num_tenants, allocator_class=GlobalPooledLRU)
+    client = client_class(GlobalPooledLRU(scheme), RTTStorage(scheme))
+    # the serial client re-enters the lock through super().handle
+    client.lock = threading.RLock()
+
+    def tenant(tntid):
+        rnd = random.Random(tntid)
+        for _ in range(REQS_PER_TENANT):
+            key = f"k{rnd.randrange(NUM_KEYS)}"
+            client.handle(tntid, key, "v", rnd.random() < 0.1, 0, 1)
+
+    threads = [threading.Thread(target=tenant, args=[t])
+               for t in range(num_tenants)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return num_tenants * REQS_PER_TENANT / (time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    print(f"{'tenants':>8} {'serial req/s':>14} {'striped req/s':>14}")
+    for num_tenants in [1, 2, 4, 8, 16, 32]:
+        serial = run(SerialCacheClient, num_tenants)
+        striped = run(CacheClient, num_tenants)
+        print(f"{num_tenants:>8} {serial:>14.0f} {striped:>14.0f}")
@@ -1,44 +1,99 @@
-import pandas as pd
+import io
+import os
+import json
 import random
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
 import zstandard as zstd
-from io import StringIO
-import json
-
-def generate_random_tenant(data, num_tenants):
-    tenants = data['tntid'].unique().tolist()
-    result = random.sample(tenants,num_tenants)
-    # print(result)
-    return result
-
-
-def update_operation(row):
-    if row['op'] in ['get', 'gets']:
-        return 'get'
-    else:
-        return 'set'
+from typing import Dict, List, Set, Tuple
+
+COLUMN_NAMES = ['ts', 'key', 'key size', 'val_size', 'tntid', 'op', 'ttl']
+CHUNK_ROWS = 1 << 20
+
+
+class TenantReservoir:
+    """ uniform sample of num_tenants among tenants seen in [start_time, end_time],
+    filled while streaming: a tenant is offered once, at its first row """
+
+    def __init__(self, start_time, end_time, num_tenants, iter_id, rng) -> None:
+        self.start_time = start_time
+        self.end_time = end_time
+        self.num_tenants = num_tenants
+        self.iter_id = iter_id
+        self.rng = rng
+        self.seen = 0
+        self.selected: List[int] = []
+
+    def offer(self, tntid) -> Tuple[bool, int]:
+        """ return whether tntid is taken, and the tenant it replaced or None """
+        self.seen += 1
+        if len(self.selected) < self.num_tenants:
+            self.selected.append(tntid)
+            return True, None
+        j = self.rng.randrange(self.seen)
+        if j < self.num_tenants:
+            replaced = self.selected[j]
+            self.selected[j] = tntid
+            return True, replaced
+        return False, None
+
+
+class TenantSpool:
+    """ on-disk per-tenant row spool, so only sampled tenants' rows are kept
+    and memory stays bounded by one chunk """
+
+    def __init__(self) -> None:
+        self.dir = tempfile.mkdtemp(prefix="deal_spool_")
+        self.refcnts: Dict[int, int] = {}
+
+    def path(self, tntid) -> str:
+        return os.path.join(self.dir, f"{tntid}.csv")
+
+    def retain(self, tntid) -> None:
+        self.refcnts[tntid] = self.refcnts.get(tntid, 0) + 1
+
+    def release(self, tntid) -> None:
+        self.refcnts[tntid] -= 1
+        if self.refcnts[tntid] == 0:
+            del self.refcnts[tntid]
+            if os.path.exists(self.path(tntid)):
+                os.remove(self.path(tntid))
+
+    def append(self, chunk) -> None:
+        chunk = chunk[chunk['tntid'].isin(self.refcnts.keys())]
+        for tntid, rows in chunk.groupby('tntid', sort=False):
+            path = self.path(tntid)
+            rows.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+    def read(self, tntids) -> pd.DataFrame:
+        frames = [pd.read_csv(self.path(t), dtype={'key': str}, keep_default_na=False)
+                  for t in tntids if os.path.exists(self.path(t))]
+        if not frames:
+            return pd.DataFrame(columns=['row'] + COLUMN_NAMES)
+        return pd.concat(frames, ignore_index=True)
+
+    def close(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def update_operation(op):
+    """ vectorized: get/gets -> get, everything else -> set """
+    return np.where(op.isin(['get', 'gets']), 'get', 'set')
 
 
 def count_operations(data):
     operation_counts = {}
-    keys = {}
-
-    for _, row in data.iterrows():
-        tntid = row['tntid']
-        op = row['op']
-
-        # Count total set and get operations
-        operation_counts.setdefault(tntid, {'set': 0, 'get': 0})
-        operation_counts[tntid][op] += 1
+    for (tntid, op), n in data.groupby(['tntid', 'op']).size().items():
+        operation_counts.setdefault(int(tntid), {'set': 0, 'get': 0})
+        operation_counts[int(tntid)][op] = int(n)
 
-        # Count unique keys for each tenant
-        keys.setdefault(tntid, set())
-        keys[tntid].add(row['key'])
-
-    # Convert sets to lists and count total unique get operations
-    total_unique_key_counts = {key: len(value) for key, value in keys.items()}
-    # Convert sets to lists
-    keys_as_lists = {key: list(value) for key, value in keys.items()}
-    # unique_key_counts_serializable = {key: list(value) for key, value in total_unique_key_counts.items()}
+    # unique keys for each tenant, in order of first use
+    uniq = data.drop_duplicates(['tntid', 'key'])
+    keys_as_lists = {int(tntid): rows.tolist()
+                     for tntid, rows in uniq.groupby('tntid', sort=False)['key']}
+    total_unique_key_counts = {tntid: len(keys) for tntid, keys in keys_as_lists.items()}
 
     return operation_counts, keys_as_lists, total_unique_key_counts
 
@@ -59,58 +114,78 @@ def create_json_file(operation_counts, total_unique_key_counts, keys, num_tenant
         json.dump(result, json_file, indent=2)
 
 
-def select_data(data, start_time, end_time, num_tenants):
-    data['ts'] = pd.to_numeric(data['ts'])
-
-    # Filter data based on time duration
-    filtered_data = data[(data['ts'] >= start_time) & (data['ts'] <= end_time)]
-
-    selected_tenants = generate_random_tenant(filtered_data,num_tenants)
+def stream_chunks(zst_file, end_time):
+    """ yield DataFrame chunks of the time-ordered trace up to end_time """
+    with open(zst_file, 'rb') as f:
+        reader = zstd.ZstdDecompressor().stream_reader(f)
+        text = io.TextIOWrapper(reader, encoding='utf-8')
+        row0 = 0
+        for chunk in pd.read_csv(text, header=None, names=COLUMN_NAMES,
+                                 dtype={'key': str}, chunksize=CHUNK_ROWS,
+                                 keep_default_na=False):
+            chunk['ts'] = pd.to_numeric(chunk['ts'])
+            chunk.insert(0, 'row', np.arange(row0, row0 + len(chunk)))
+            row0 += len(chunk)
+            past = chunk['ts'] > end_time
+            yield chunk[~past]
+            if past.any():
+                return
+
+
+def slice_trace(zst_file, start_time, end_times, num_tenants_list, iter_ids, seed=None):
+    """ write every (end_time, num_tenants, iter) subset and its op-count sidecar
+    with a single streaming pass over zst_file; subsets whose window holds
+    fewer than num_tenants tenants are skipped """
+    rng = random.Random(seed)
+    reservoirs = [TenantReservoir(start_time, e, n, i, rng)
+                  for e in end_times for n in num_tenants_list for i in iter_ids]
+    spool = TenantSpool()
+    seen: Set[int] = set()
+    try:
+        for chunk in stream_chunks(zst_file, max(end_times)):
+            chunk = chunk[chunk['ts'] >= start_time].copy()
+            chunk['op'] = update_operation(chunk['op'])
+            firsts = chunk.drop_duplicates('tntid')
+            for tntid, ts in zip(firsts['tntid'], firsts['ts']):
+                if tntid in seen:
+                    continue
+                seen.add(tntid)
+                for res in reservoirs:
+                    if ts > res.end_time:
+                        continue
+                    taken, replaced = res.offer(tntid)
+                    if taken:
+                        spool.retain(tntid)
+                    if replaced is not None:
+                        spool.release(replaced)
+            spool.append(chunk)
+
+        for res in reservoirs:
+            if len(res.selected) < res.num_tenants:
+                # the file name would overstate the tenant count
+                print(f'skipped:time_{start_time}-{res.end_time}-tenant_num_{res.num_tenants}-iter_{res.iter_id}:'
+                      f' only {len(res.selected)} tenants in the window')
+                continue
+            selected_data = spool.read(res.selected)
+            selected_data = selected_data[selected_data['ts'] <= res.end_time]
+            selected_data = selected_data.sort_values('row').drop(columns='row')
+
+            selected_data_filename = f'data/trace/selected_data_tenant{res.num_tenants}_time{start_time}-{res.end_time}_iter{res.iter_id}.csv'
+            selected_data.to_csv(selected_data_filename, index=False)
+
+            operation_counts, keys, total_unique_key_counts = count_operations(selected_data)
+            create_json_file(operation_counts, total_unique_key_counts, keys,
+                             res.num_tenants, start_time, res.end_time, res.iter_id)
+            print(f'finished:time_{start_time}-{res.end_time}-tenant_num_{res.num_tenants}-iter_{res.iter_id}')
+    finally:
+        spool.close()
 
-    # # Randomly select tenants
-    # for _ in range(num_tenants):
-    #     tenant = generate_random_tenant(filtered_data)
-    #     selected_tenants.append(tenant)
-
-    # Filter data based on selected tenants
-    final_data = filtered_data[filtered_data['tntid'].isin(selected_tenants)]
-
-    # Update the "operation" column
-    final_data['op'] = final_data.apply(update_operation, axis=1)
-
-    return final_data, selected_tenants
 
 # Example usage:
 if __name__ == "__main__":
     # Set the time duration (replace 0 and 1 with your desired start and end times)
     start_time = 0
-    for end_time in [10,60,900]:
-        for num_tenants in [1, 2, 3, 10, 50]:
-            for iter_id in [0,1,2]:
-
-                # Replace 'your_data.zst' with the actual path to your zst data file
-                with open('data/memcached/cluster01.000.zst', 'rb') as f:
-                    dctx = zstd.ZstdDecompressor()
-                    compressed_data = f.read()
-                    decompressed_data = dctx.decompress(compressed_data)
-
-                # Convert the decompressed data to a DataFrame with modified column names
-                column_names = ['ts', 'key', 'key size', 'val_size', 'tntid', 'op', 'ttl']
-                data = pd.read_csv(StringIO(decompressed_data.decode('utf-8')), header=None, names=column_names)
-
-
-
-                # Call the function to select data based on the specified criteria
-                selected_data, selected_tenants = select_data(data, start_time, end_time, num_tenants)
-
-                # Save the selected data to a CSV file with modified file name
-                selected_data_filename = f'data/trace/selected_data_tenant{num_tenants}_time{start_time}-{end_time}_iter{iter_id}.csv'
-                selected_data.to_csv(selected_data_filename, index=False)
-
-                # Display the selected data with modified column names
-                print(selected_data)
-
-                # Count operations and create a JSON file with modified file name
-                operation_counts,keys,total_unique_key_counts = count_operations(selected_data)
-                create_json_file(operation_counts, total_unique_key_counts, keys, num_tenants, start_time, end_time,iter_id)
-                print(f'finished:tenant_num_{num_tenants}-iter_{iter_id}')
+    slice_trace('data/memcached/cluster01.000.zst', start_time,
+                end_times=[10, 60, 900],
+                num_tenants_list=[1, 2, 3, 10, 50],
+                iter_ids=[0, 1, 2])
@@ -1,12 +1,22 @@
-from typing import Tuple
+from typing import Tuple, List, Dict, Optional
+from collections import defaultdict
 
 from service.scheme import CacheScheme
+from service.allocator.timingwheel import TimingWheel
+from service.allocator.entrystore import create_entry_store
+from service.allocator.slab import create_slab_classes
+from service.allocator.metrics import AllocatorMetrics
 
 
 class Allocator:
     def __init__(self, scheme: CacheScheme) -> None:
         self.name = "AbstractAllocator"
         self.scheme = scheme
+        self.entries = create_entry_store(scheme)
+        self.wheel = TimingWheel(scheme.ttl_tick)
+        self.reclaimed: Dict[str, int] = defaultdict(int)  # expired capacity per tenant
+        self.slabs = create_slab_classes(scheme)
+        self.metrics = AllocatorMetrics(scheme) if scheme.allocator_metrics else None
 
     @property
     def num_tnts(self) -> int:
@@ -20,18 +30,124 @@ class Allocator:
         """ return whether key is in cache """
         raise NotImplementedError("key_in_cache")
 
-    def cache_isfull(self) -> bool:
-        """ return whether cache is full """
+    def _charge(self, val_size) -> int:
+        """ capacity an entry of val_size takes, in units of cache_size """
+        if self.scheme.capacity == "objects":
+            return 1
+        if self.scheme.capacity == "bytes":
+            return int(val_size)
+        if self.scheme.capacity == "slabs":
+            return self.slabs.chunk_size(int(val_size))
+        raise ValueError(f"unknown capacity unit {self.scheme.capacity}")
+
+    def cache_isfull(self, val_size) -> bool:
+        """ return whether cache has no room for an entry of val_size """
         raise NotImplementedError("cache_isfull")
 
     def inform_use(self, tntid, key) -> None:
         """ called when a key is read or updated; only update last use ts """
         raise NotImplementedError("inform_use")
 
-    def inform_set(self, tntid, key, ttl) -> None:
+    def inform_set(self, tntid, key, ttl, val_size) -> None:
         """ called when a new key is brought into cache """
         raise NotImplementedError("inform_set")
 
-    def arbit_evict(self, tntid, key) -> Tuple[str, str]:
+    def arbit_evict(self, tntid, key, val_size) -> Tuple[str, str]:
         """ called when a new key should be brought in and cache is full """
         raise NotImplementedError("arbit_evict")
+
+    def tenant_usage(self) -> Dict[str, int]:
+        """ capacity each tenant holds, in units of cache_size """
+        raise NotImplementedError("tenant_usage")
+
+    def inform_resize(self, tntid, key, val_size) -> List[Tuple[str, str]]:
+        """ called when a cached key is set again; charge it for val_size,
+        evicting others until it fits, and return the evicted (tntid, key)s """
+        raise NotImplementedError("inform_resize")
+
+    def get_entry(self, tntid, key) -> Optional[int]:
+        """ return the slot of key in entries, or None """
+        return self.entries.find(tntid, key)
+
+    def remove(self, tntid, key) -> None:
+        """ called when a key leaves cache other than by eviction """
+        raise NotImplementedError("remove")
+
+    def _schedule_expiry(self, slot, ttl) -> None:
+        """ file a newly set entry in the timing wheel; ttl 0 never expires """
+        if ttl > 0:
+            now = self.scheme.clock()
+            self.wheel.add(self.entries.handle(slot), now + ttl, now)
+
+    def _set_again(self, tntid, key, ttl, val_size) -> List[Tuple[str, str]]:
+        """ write hit: re-charge the entry, evict others until it fits and
+        restart its ttl; return the evicted (tntid, key)s, which hold the
+        key itself when it no longer fits at all """
+        if self._charge(val_size) > self.scheme.cache_size:
+            self.remove(tntid, key)
+            return [(tntid, key)]
+        evicted = self.inform_resize(tntid, key, val_size)
+        slot = self.get_entry(tntid, key)
+        if slot is not None:
+            self._reset_expiry(slot, ttl)
+        return evicted
+
+    def _evict_overfull(self, tntid, key, val_size) -> List[Tuple[str, str]]:
+        """ evict until the capacity held, cache_used, fits cache_size """
+        evicted = []
+        while self.cache_used > self.scheme.cache_size:
+            evicted.append(self.arbit_evict(tntid, key, val_size))
+        return evicted
+
+    def _reset_expiry(self, slot, ttl) -> None:
+        """ drop the entry's pending expiry and file ttl from now instead """
+        self.entries.renew(slot)
+        self._schedule_expiry(slot, ttl)
+
+    def expire(self) -> List[Tuple[str, str]]:
+        """ remove entries whose ttl has passed; return their (tntid, key) """
+        expired = []
+        for handle in self.wheel.advance(self.scheme.clock()):
+            # skip entries already evicted, or replaced by a later set
+            slot = self.entries.resolve(handle)
+            if slot is None:
+                continue
+            tntid, key, size = self.entries.tntid(slot), self.entries.keys[slot], self.entries.size[slot]
+            self.remove(tntid, key)
+            self.reclaimed[tntid] += size
+            expired.append((tntid, key))
+        return expired
+
+    def access(self, tntid, key, ttl, val_size, iswrite=False) -> Tuple[bool, List[Tuple[str, str]], List[Tuple[str, str]]]:
+        """ run one request through the allocator; return hit, the evicted
+        (tntid, key)s and the (tntid, key)s expired beforehand. an entry is
+        charged the val_size it was last set with: a write hit sets it again,
+        re-charging it and restarting its ttl """
+        expired = self.expire()
+        hit, evicted = False, []
+        if self.key_in_cache(tntid, key):
+            self.inform_use(tntid, key)
+            if iswrite:
+                evicted = self._set_again(tntid, key, ttl, val_size)
+            hit = True
+        elif self._charge(val_size) <= self.scheme.cache_size:  # larger values are never stored
+            while self.cache_isfull(val_size):
+                evicted.append(self.arbit_evict(tntid, key, val_size))
+            self.inform_set(tntid, key, ttl, val_size)
+        if self.metrics is not None:
+            self._observe(hit, evicted, expired)
+        return hit, evicted, expired
+
+    def _observe(self, hit, evicted, expired) -> None:
+        m = self.metrics
+        m.count("hit" if hit else "miss")
+        m.count("evicted", len(evicted))
+        m.count("expired", len(expired))
+        now = self.scheme.clock()
+        if m.due(now):
+            m.sample(now, self.tenant_usage())
+
+    def save_metrics(self, dst: str) -> None:
+        """ export metrics next to result file dst, if collected """
+        if self.metrics is not None:
+            self.metrics.save(dst)
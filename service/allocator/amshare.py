@@ -1,36 +1,81 @@
-from enum import Enum
-import time
-from typing import Tuple, List, Dict, Optional
+from enum import IntEnum
+import heapq
+import struct
+from typing import Tuple, List, Dict, Optional, Set
 from collections import defaultdict
-from dataclasses import dataclass
 
 from service.scheme import CacheScheme
 from service.allocator.abstract import Allocator
+from service.allocator.victimq import VictimQueue
 
 
-class EntryStatus(Enum):
+class EntryStatus(IntEnum):
     IN_SMALL = 1
     IN_MAIN_DEMOTABLE = 2
     IN_MAIN_FULL = 3
 
 
-@dataclass
-class CacheObject:
-    tntid: str
-    key: str
-    last_used: float
-    status: EntryStatus
-    use_cnt: int
+# heap item: one int packing last_used, seq, version and slot, most
+# significant first, so items order as (last_used, seq) tuples would
+# while costing one int object per entry instead of a tuple of four
+HeapItem = int
+MASK32 = 0xFFFFFFFF
+_DOUBLE, _U64 = struct.Struct("d"), struct.Struct("Q")
+
+
+def _ts_bits(ts) -> int:
+    """ int with the order of non-negative float ts """
+    return _U64.unpack(_DOUBLE.pack(ts))[0]
+
+
+def _heap_item(last_used, seq, version, slot) -> HeapItem:
+    return _ts_bits(last_used) << 128 | seq << 64 | version << 32 | slot
 
 
 class AMShare(Allocator):
     def __init__(self, scheme: CacheScheme) -> None:
+        super().__init__(scheme)
         self.name = "AMShare"
-        self.scheme = scheme
 
-        self.small_qs: Dict[str, List[CacheObject]] = defaultdict(list)
-        self.victim_qs: Dict[str, List[str]] = defaultdict(list)
-        self.main_cache: List[CacheObject] = []
+        # entries' status is an EntryStatus; per-slot extras below
+        self.use_cnt = self.entries.field("i")
+        self.seq = self.entries.field("q")  # order of arrival in main cache, breaks last_used ties
+        self.version = self.entries.field("I")  # bumped on every change; stale heap items mismatch
+
+        # per-tenant fifo, newest first, as a list in entries
+        self.small_qs: Dict[str, int] = defaultdict(self.entries.new_list)
+        self.victim_qs: Dict[str, VictimQueue] = defaultdict(VictimQueue)
+
+        # main cache, split by status into per-tenant lazily invalidated heaps
+        self.main_heaps: Dict[EntryStatus, Dict[str, List[HeapItem]]] = {
+            EntryStatus.IN_MAIN_DEMOTABLE: defaultdict(list),
+            EntryStatus.IN_MAIN_FULL: defaultdict(list),
+        }
+        self.main_cnts: Dict[EntryStatus, Dict[str, int]] = {
+            EntryStatus.IN_MAIN_DEMOTABLE: defaultdict(int),
+            EntryStatus.IN_MAIN_FULL: defaultdict(int),
+        }
+        self.main_seq = 0
+        # per status, lazily invalidated min-heap of (top, version, tntid)
+        # over the heap tops of tenants holding more than guar_size, where
+        # top is a heap item's (last_used, seq) part
+        self.top_heaps: Dict[EntryStatus, List[Tuple[int, int, str]]] = {
+            EntryStatus.IN_MAIN_DEMOTABLE: [],
+            EntryStatus.IN_MAIN_FULL: [],
+        }
+        self.top_keys: Dict[EntryStatus, Dict[str, int]] = {
+            EntryStatus.IN_MAIN_DEMOTABLE: {},
+            EntryStatus.IN_MAIN_FULL: {},
+        }
+        self.top_versions: Dict[EntryStatus, Dict[str, int]] = {
+            EntryStatus.IN_MAIN_DEMOTABLE: defaultdict(int),
+            EntryStatus.IN_MAIN_FULL: defaultdict(int),
+        }
+
+        self.sq_used: Dict[str, int] = defaultdict(int)
+        self.cache_used = 0
+        self.tenant_used: Dict[str, int] = defaultdict(int)
+        self.over_guar: Set[str] = set()  # tenants holding more than guar_size
 
     @property
     def sq_size(self):
@@ -45,129 +90,240 @@ class AMShare(Allocator):
                    / self.scheme.num_tenants
                    * self.scheme.guarantee_ratio))
 
-    def _find_in_sq(self, tntid, key) -> Optional[CacheObject]:
-        for co in self.small_qs[tntid]:
-            if co.key == key:
-                return co
-        return None
-
     def _find_in_vq(self, tntid, key) -> bool:
-        for k in self.victim_qs[tntid]:
-            if k == key:
-                return True
-        return False
-
-    def _find_in_maincache(self, tntid, key) -> Optional[CacheObject]:
-        for co in self.main_cache:
-            if co.tntid == tntid and co.key == key:
-                return co
-        return None
-
-    def _find_co(self, tntid, key) -> Optional[CacheObject]:
-        co = self._find_in_sq(tntid, key)
-        if co is not None:
-            return co
-        co = self._find_in_maincache(tntid, key)
-        if co is not None:
-            return co
-        return None
+        return key in self.victim_qs[tntid]
 
     def key_in_cache(self, tntid, key) -> bool:
         """ return whether key is in cache """
-        return self._find_co(tntid, key) is not None
+        return self.entries.find(tntid, key) is not None
+
+    def cache_isfull(self, val_size) -> bool:
+        """ return whether cache has no room for an entry of val_size """
+        return self.cache_used + self._charge(val_size) > self.scheme.cache_size
+
+    def _add_tenant_used(self, tntid, delta) -> None:
+        self.cache_used += delta
+        used = self.tenant_used[tntid] + delta
+        self.tenant_used[tntid] = used
+        if (used > self.guar_size) == (tntid in self.over_guar):
+            return
+        if used > self.guar_size:
+            self.over_guar.add(tntid)
+        else:
+            self.over_guar.discard(tntid)
+        self._refresh_top(EntryStatus.IN_MAIN_DEMOTABLE, tntid)
+        self._refresh_top(EntryStatus.IN_MAIN_FULL, tntid)
+
+    def _bump_version(self, slot) -> int:
+        version = (self.version[slot] + 1) & MASK32
+        self.version[slot] = version
+        return version
+
+    def _valid_item(self, item: HeapItem) -> bool:
+        return (item >> 32) & MASK32 == self.version[item & MASK32]
 
-    def _cache_cnt(self) -> int:
-        sq_cnt = 0
-        for _, sq in self.small_qs.items():
-            sq_cnt += len(sq)
-        return len(self.main_cache) + sq_cnt
+    def _push_main(self, slot) -> None:
+        version = self._bump_version(slot)
+        status, tntid = self.entries.status[slot], self.entries.tntid(slot)
+        heap = self.main_heaps[status][tntid]
+        heapq.heappush(heap, _heap_item(self.entries.last_used[slot], self.seq[slot], version, slot))
+        # drop stale items once they outnumber live ones
+        if len(heap) > 2 * self.main_cnts[status][tntid] + 64:
+            live = [item for item in heap if self._valid_item(item)]
+            heapq.heapify(live)
+            self.main_heaps[status][tntid] = live
+        self._refresh_top(status, tntid)
 
-    def cache_isfull(self) -> bool:
-        """ return whether cache is full """
-        return self._cache_cnt() >= self.scheme.cache_size
+    def _insert_main(self, slot) -> None:
+        self.seq[slot] = self.main_seq
+        self.main_seq += 1
+        self.main_cnts[self.entries.status[slot]][self.entries.tntid(slot)] += 1
+        self._push_main(slot)
+
+    def _remove_main(self, slot) -> None:
+        self._bump_version(slot)
+        status, tntid = self.entries.status[slot], self.entries.tntid(slot)
+        self.main_cnts[status][tntid] -= 1
+        self._refresh_top(status, tntid)
+
+    def _peek_main(self, status: EntryStatus, tntid) -> Optional[HeapItem]:
+        heap = self.main_heaps[status].get(tntid)
+        while heap:
+            item = heap[0]
+            if self._valid_item(item):
+                return item
+            heapq.heappop(heap)
+        return None
+
+    def _refresh_top(self, status: EntryStatus, tntid) -> None:
+        """ re-key tenant in top_heaps[status] after its heap top or
+        over-guarantee state may have changed """
+        item = self._peek_main(status, tntid) if tntid in self.over_guar else None
+        top = None if item is None else item >> 64
+        keys = self.top_keys[status]
+        if keys.get(tntid) == top:
+            return
+        versions = self.top_versions[status]
+        versions[tntid] += 1
+        if top is None:
+            del keys[tntid]
+            return
+        keys[tntid] = top
+        heap = self.top_heaps[status]
+        heapq.heappush(heap, (top, versions[tntid], tntid))
+        if len(heap) > 2 * len(keys) + 64:
+            live = [item for item in heap if self._valid_top(status, item)]
+            heapq.heapify(live)
+            self.top_heaps[status] = live
+
+    def _valid_top(self, status: EntryStatus, item) -> bool:
+        return item[1] == self.top_versions[status][item[2]] and item[2] in self.top_keys[status]
+
+    def _oldest_main(self, status: EntryStatus) -> Optional[int]:
+        """ oldest entry of status among over-guaranteed tenants """
+        heap = self.top_heaps[status]
+        popped = 0
+        while heap and not self._valid_top(status, heap[0]):
+            heapq.heappop(heap)
+            popped += 1
+        if self.metrics is not None:
+            self.metrics.scan("stale_top_pops_" + status.name.lower(), popped)
+        if not heap:
+            return None
+        return self._peek_main(status, heap[0][2]) & MASK32
 
     def inform_use(self, tntid, key) -> None:
         """ called when a key is read or updated; only update last use ts """
-        co = self._find_co(tntid, key)
-        co.last_used = time.time()
-        if co.status == EntryStatus.IN_MAIN_FULL:
-            pass
-        elif co.status == EntryStatus.IN_MAIN_DEMOTABLE:
-            co.status = EntryStatus.IN_MAIN_FULL
-        elif co.status == EntryStatus.IN_SMALL:
-            co.use_cnt += 1
+        slot = self.entries.find(tntid, key)
+        self.entries.last_used[slot] = self.scheme.clock()
+        status = self.entries.status[slot]
+        if status == EntryStatus.IN_MAIN_FULL:
+            self._push_main(slot)
+        elif status == EntryStatus.IN_MAIN_DEMOTABLE:
+            self._remove_main(slot)
+            self.entries.status[slot] = EntryStatus.IN_MAIN_FULL
+            self.main_cnts[EntryStatus.IN_MAIN_FULL][tntid] += 1
+            self._push_main(slot)
+        elif status == EntryStatus.IN_SMALL:
+            self.use_cnt[slot] += 1
         else:
             raise
 
-    def inform_set(self, tntid, key, ttl) -> None:
+    def inform_set(self, tntid, key, ttl, val_size) -> None:
         """ called when a new key is brought into cache """
-        cc0 = self._cache_cnt()
         key_in_victim = self._find_in_vq(tntid, key)
+        size = self._charge(val_size)
+        status = EntryStatus.IN_MAIN_FULL if key_in_victim else EntryStatus.IN_SMALL
+        slot = self.entries.alloc(tntid, key, self.scheme.clock(), size, status)
+        self.use_cnt[slot] = 1
         if key_in_victim:
-            co = CacheObject(tntid, key, time.time(),
-                             EntryStatus.IN_MAIN_FULL, 1)
-            self.main_cache.append(co)
+            self._insert_main(slot)
+        else:
+            self._append_sq(tntid, slot)
+        self._add_tenant_used(tntid, size)
+        self._schedule_expiry(slot, ttl)
+
+    def remove(self, tntid, key) -> None:
+        """ called when a key leaves cache other than by eviction;
+        expired keys were not victimized, so they skip the victim queue """
+        slot = self.entries.find(tntid, key)
+        size = self.entries.size[slot]
+        if self.entries.status[slot] == EntryStatus.IN_SMALL:
+            self.entries.unlink(slot)
+            self.sq_used[tntid] -= size
         else:
-            co = CacheObject(tntid, key, time.time(), EntryStatus.IN_SMALL, 1)
-            self._append_sq(co)
-        assert self._cache_cnt() == cc0 + 1
-
-    def _append_sq(self, co: CacheObject) -> None:
-        cc0 = self._cache_cnt()
-        tntid = co.tntid
-        self.small_qs[tntid].append(co)
-        if len(self.small_qs[tntid]) > self.sq_size:
-            pop = self.small_qs[tntid][0]
-            self.small_qs[tntid] = self.small_qs[tntid][1:]
-            pop.status = EntryStatus.IN_MAIN_FULL if pop.use_cnt > 1 else EntryStatus.IN_MAIN_DEMOTABLE
-            self.main_cache.append(pop)
-        assert self._cache_cnt() == cc0 + 1
+            self._remove_main(slot)
+        self.entries.release(slot)
+        self._add_tenant_used(tntid, -size)
+
+    def inform_resize(self, tntid, key, val_size) -> List[Tuple[str, str]]:
+        """ called when a cached key is set again """
+        slot, size = self.entries.find(tntid, key), self._charge(val_size)
+        delta = size - self.entries.size[slot]
+        if delta == 0:
+            return []
+        self.entries.size[slot] = size
+        if self.entries.status[slot] == EntryStatus.IN_SMALL:
+            self.sq_used[tntid] += delta
+            self._trim_sq(tntid)
+        self._add_tenant_used(tntid, delta)
+        return self._evict_overfull(tntid, key, val_size)
+
+    def _append_sq(self, tntid, slot) -> None:
+        self.entries.push_front(self.small_qs[tntid], slot)
+        self.sq_used[tntid] += self.entries.size[slot]
+        self._trim_sq(tntid)
+
+    def _trim_sq(self, tntid) -> None:
+        """ promote the oldest small queue entries while it is over sq_size """
+        head = self.small_qs[tntid]
+        while self.sq_used[tntid] > self.sq_size:
+            pop = self.entries.back(head)
+            self.entries.unlink(pop)
+            self.sq_used[tntid] -= self.entries.size[pop]
+            self.entries.status[pop] = (EntryStatus.IN_MAIN_FULL if self.use_cnt[pop] > 1
+                                        else EntryStatus.IN_MAIN_DEMOTABLE)
+            self._insert_main(pop)
 
     def _append_vq(self, tntid, key) -> None:
-        self.victim_qs[tntid].append(key)
         # victim q has same len as guaranteed
-        if len(self.victim_qs[tntid]) > self.guar_size:
-            self.victim_qs[tntid] = self.victim_qs[tntid][1:]
+        self.victim_qs[tntid].append(key, self.guar_size)
+
+    def _evict(self, slot) -> Tuple[str, str]:
+        tntid, key = self.entries.tntid(slot), self.entries.keys[slot]
+        self._add_tenant_used(tntid, -self.entries.size[slot])
+        self.entries.release(slot)
+        self._append_vq(tntid, key)
+        return tntid, key
 
-    def arbit_evict(self, tntid, key) -> Tuple[str, str]:
+    def arbit_evict(self, tntid, key, val_size) -> Tuple[str, str]:
         """ called when a new key should be brought in and cache is full """
-        cc0 = self._cache_cnt()
-        # get victim tenant candidates
-        tenant_cachecnts: Dict[str, int] = defaultdict(int)
-        for t, q in self.small_qs.items():
-            tenant_cachecnts[t] += len(q)
-        for co in self.main_cache:
-            tenant_cachecnts[co.tntid] += 1
-        victen_cands = [t for t, cnt in tenant_cachecnts.items()
-                        if cnt > self.guar_size]
+        # victim tenant candidates are tenants holding more than guaranteed
         # try to evict from demotables in main cache
-        demotable = []
-        for i, co in enumerate(self.main_cache):
-            if co.status == EntryStatus.IN_MAIN_DEMOTABLE and co.tntid in victen_cands:
-                demotable.append((co.last_used, i, co.tntid, co.key))
-        if demotable:
-            _, i, etntid, ekey = sorted(demotable)[0]
-            self._append_vq(etntid, ekey)
-            self.main_cache = self.main_cache[:i] + self.main_cache[i+1:]
-            assert self._cache_cnt() == cc0 - 1
-            return etntid, ekey
+        slot = self._oldest_main(EntryStatus.IN_MAIN_DEMOTABLE)
+        if slot is not None:
+            self._count("evict_demotable")
+            self._remove_main(slot)
+            return self._evict(slot)
         # to reach here, all entries in main cache are frequently accessed
-        # first, look at smallq of the inserting tenant
-        if tntid in victen_cands and len(self.small_qs[tntid]) == self.sq_size:
-            assert self.small_qs[tntid], f"{self.small_qs}, {tenant_cachecnts}, {victen_cands}"
-            head = self.small_qs[tntid][0]
-            if head.use_cnt == 1:
-                self.small_qs[tntid] = self.small_qs[tntid][1:]
-                self._append_vq(head.tntid, head.key)
-                assert self._cache_cnt() == cc0 - 1
-                return head.tntid, head.key
+        # first, look at smallq of the inserting tenant, if the incoming
+        # entry would overflow it
+        if tntid in self.over_guar and self.sq_used[tntid] + self._charge(val_size) > self.sq_size:
+            head = self.entries.back(self.small_qs[tntid])
+            if head is not None and self.use_cnt[head] == 1:
+                self._count("evict_smallq")
+                return self._evict_sq_head(tntid)
         # then, evict from IN_MAIN_FULL
-        evictable = []
-        for i, co in enumerate(self.main_cache):
-            if co.tntid in victen_cands:
-                evictable.append((co.last_used, i, co.tntid, co.key))
-        _, i, etntid, ekey = sorted(evictable)[0]
-        self._append_vq(etntid, ekey)
-        self.main_cache = self.main_cache[:i] + self.main_cache[i+1:]
-        assert self._cache_cnt() == cc0 - 1
-        return etntid, ekey
+        slot = self._oldest_main(EntryStatus.IN_MAIN_FULL)
+        if slot is None:
+            self._count("evict_largest")
+            return self._evict_largest_holder()
+        self._count("evict_full")
+        self._remove_main(slot)
+        return self._evict(slot)
+
+    def _count(self, name) -> None:
+        if self.metrics is not None:
+            self.metrics.count(name)
+
+    def _evict_sq_head(self, tntid) -> Tuple[str, str]:
+        head = self.entries.back(self.small_qs[tntid])
+        self.entries.unlink(head)
+        self.sq_used[tntid] -= self.entries.size[head]
+        return self._evict(head)
+
+    def _evict_largest_holder(self) -> Tuple[str, str]:
+        """ over-guaranteed tenants hold nothing evictable in main cache,
+        e.g. a large value arrives while nobody exceeds a byte guarantee;
+        take the oldest entry of whoever holds the most """
+        victim = max(self.tenant_used, key=self.tenant_used.get)
+        for status in (EntryStatus.IN_MAIN_DEMOTABLE, EntryStatus.IN_MAIN_FULL):
+            item = self._peek_main(status, victim)
+            if item is not None:
+                slot = item & MASK32
+                self._remove_main(slot)
+                return self._evict(slot)
+        return self._evict_sq_head(victim)
+
+    def tenant_usage(self) -> Dict[str, int]:
+        return dict(self.tenant_used)
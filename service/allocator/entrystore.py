@@ -0,0 +1,236 @@
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class EntryStore:
+    """ cache entries of one allocator as slots of parallel typed arrays,
+    instead of one python object each. a slot holds the entry's tenant
+    (interned), key, last use ts, charged size and an allocator-defined
+    status, plus prev/next slot links for the intrusive doubly linked lists
+    allocators keep entries on. a list is a circular chain through a
+    sentinel slot; freed slots are chained through next and reused first.
+
+    gen is bumped when a slot is freed or its entry is set again, so
+    handle(slot) names one setting of an entry: a handle filed in the
+    timing wheel goes stale once its entry leaves or is reset """
+
+    FREE = -1  # status of a slot on the free list
+    SENTINEL = -2  # status of a list head
+    NIL = -1
+
+    def __init__(self, capacity=1024) -> None:
+        self.prev = array("i")
+        self.next = array("i")
+        self.last_used = array("d")
+        self.tenant = array("i")  # index into tntids
+        self.size = array("q")  # capacity charged, in units of cache_size
+        self.status = array("h")
+        self.gen = array("I")
+        self.keys = self._key_column()
+        self.extra: List[array] = []  # per-slot fields added by allocators
+
+        self.tntids: List = []
+        self.tenant_ids: Dict[object, int] = {}
+        self.index: Dict[object, Dict[object, int]] = {}  # tntid -> key -> slot
+        self.free = self.NIL
+        self.live = 0
+        self._grow(capacity)
+
+    def __len__(self) -> int:
+        return self.live
+
+    def field(self, typecode) -> array:
+        """ add a zeroed per-slot array, kept as long as the store; values
+        survive freeing, so a slot's next entry must set them """
+        a = array(typecode, [0]) * len(self.prev)
+        self.extra.append(a)
+        return a
+
+    def _grow(self, n) -> None:
+        """ append n slots and chain them onto the free list in order """
+        base = len(self.prev)
+        for a in (self.prev, self.tenant, self.size, self.gen, *self.extra):
+            a.extend(array(a.typecode, [0]) * n)
+        self.last_used.extend(array("d", [0.0]) * n)
+        self.status.extend(array("h", [self.FREE]) * n)
+        self.next.extend(array("i", range(base + 1, base + n + 1)))
+        self.next[base + n - 1] = self.free
+        self._extend_keys(n)
+        self.free = base
+
+    def _key_column(self):
+        return []
+
+    def _extend_keys(self, n) -> None:
+        self.keys.extend([None] * n)
+
+    def _take(self) -> int:
+        if self.free == self.NIL:
+            self._grow(len(self.prev))
+        slot = self.free
+        self.free = self.next[slot]
+        return slot
+
+    def _tenant_id(self, tntid) -> int:
+        tid = self.tenant_ids.get(tntid)
+        if tid is None:
+            tid = self.tenant_ids[tntid] = len(self.tntids)
+            self.tntids.append(tntid)
+            self.index[tntid] = {}
+        return tid
+
+    def alloc(self, tntid, key, last_used, size, status=0) -> int:
+        """ new unlinked entry for key; return its slot """
+        slot = self._take()
+        self.tenant[slot] = self._tenant_id(tntid)
+        self.keys[slot] = key
+        self.last_used[slot] = last_used
+        self.size[slot] = size
+        self.status[slot] = status
+        self.prev[slot] = self.next[slot] = slot
+        self.index[tntid][key] = slot
+        self.live += 1
+        return slot
+
+    def release(self, slot) -> None:
+        """ drop the entry at an unlinked slot and free the slot """
+        del self.index[self.tntids[self.tenant[slot]]][self.keys[slot]]
+        self.keys[slot] = None
+        self.status[slot] = self.FREE
+        self.gen[slot] = (self.gen[slot] + 1) & 0xFFFFFFFF
+        self.next[slot] = self.free
+        self.free = slot
+        self.live -= 1
+
+    def find(self, tntid, key) -> Optional[int]:
+        """ slot of key, or None """
+        keys = self.index.get(tntid)
+        return None if keys is None else keys.get(key)
+
+    def items(self) -> Iterator[Tuple[object, object, int]]:
+        """ (tntid, key, slot) of every live entry """
+        for tntid, keys in self.index.items():
+            for key, slot in keys.items():
+                yield tntid, key, slot
+
+    def tntid(self, slot):
+        return self.tntids[self.tenant[slot]]
+
+    def handle(self, slot) -> int:
+        """ one int naming the entry now at slot """
+        return self.gen[slot] << 32 | slot
+
+    def renew(self, slot) -> None:
+        """ make handles of the entry at slot stale """
+        self.gen[slot] = (self.gen[slot] + 1) & 0xFFFFFFFF
+
+    def resolve(self, handle) -> Optional[int]:
+        """ slot of the entry handle names, or None if it has left """
+        slot = handle & 0xFFFFFFFF
+        if self.gen[slot] != handle >> 32 or self.status[slot] == self.FREE:
+            return None
+        return slot
+
+    # intrusive lists
+
+    def new_list(self) -> int:
+        """ empty list; return its sentinel slot """
+        head = self._take()
+        self.status[head] = self.SENTINEL
+        self.prev[head] = self.next[head] = head
+        return head
+
+    def push_front(self, head, slot) -> None:
+        nxt = self.next[head]
+        self.prev[slot] = head
+        self.next[slot] = nxt
+        self.next[head] = slot
+        self.prev[nxt] = slot
+
+    def move_front(self, head, slot) -> None:
+        """ unlink slot and push it to the front of head's list """
+        prevs, nexts = self.prev, self.next
+        prv, nxt = prevs[slot], nexts[slot]
+        nexts[prv] = nxt
+        prevs[nxt] = prv
+        nxt = nexts[head]
+        prevs[slot] = head
+        nexts[slot] = nxt
+        nexts[head] = slot
+        prevs[nxt] = slot
+
+    def unlink(self, slot) -> None:
+        prv, nxt = self.prev[slot], self.next[slot]
+        self.next[prv] = nxt
+        self.prev[nxt] = prv
+
+    def back(self, head) -> Optional[int]:
+        """ last slot of the list, or None if it is empty """
+        slot = self.prev[head]
+        return None if slot == head else slot
+
+
+class DenseEntryStore(EntryStore):
+    """ EntryStore for interned keys, ints in [0, num_keys) such as a
+    Trace's pair ids, which already name the tenant too: keys live in a
+    typed array and slot_of[key] replaces the per-tenant key dicts """
+
+    def __init__(self, num_keys, capacity=1024) -> None:
+        self.slot_of = array("i", [self.NIL]) * num_keys
+        super().__init__(capacity)
+
+    def _key_column(self):
+        return array("q")
+
+    def _extend_keys(self, n) -> None:
+        self.keys.extend(array("q", [-1]) * n)
+
+    def _tenant_id(self, tntid) -> int:
+        tid = self.tenant_ids.get(tntid)
+        if tid is None:
+            tid = self.tenant_ids[tntid] = len(self.tntids)
+            self.tntids.append(tntid)
+        return tid
+
+    def alloc(self, tntid, key, last_used, size, status=0) -> int:
+        """ new unlinked entry for key; return its slot """
+        if key >= len(self.slot_of):
+            self.slot_of.extend(array("i", [self.NIL]) * (key + 1 - len(self.slot_of)))
+        slot = self._take()
+        self.tenant[slot] = self._tenant_id(tntid)
+        self.keys[slot] = key
+        self.last_used[slot] = last_used
+        self.size[slot] = size
+        self.status[slot] = status
+        self.prev[slot] = self.next[slot] = slot
+        self.slot_of[key] = slot
+        self.live += 1
+        return slot
+
+    def release(self, slot) -> None:
+        """ drop the entry at an unlinked slot and free the slot """
+        self.slot_of[self.keys[slot]] = self.NIL
+        self.status[slot] = self.FREE
+        self.gen[slot] = (self.gen[slot] + 1) & 0xFFFFFFFF
+        self.next[slot] = self.free
+        self.free = slot
+        self.live -= 1
+
+    def find(self, tntid, key) -> Optional[int]:
+        """ slot of key, or None """
+        if key >= len(self.slot_of):
+            return None
+        slot = self.slot_of[key]
+        return None if slot == self.NIL else slot
+
+    def items(self) -> Iterator[Tuple[object, object, int]]:
+        for key, slot in enumerate(self.slot_of):
+            if slot != self.NIL:
+                yield self.tntids[self.tenant[slot]], key, slot
+
+
+def create_entry_store(scheme) -> EntryStore:
+    """ dense store when the scheme's keys are interned pair ids """
+    if scheme.num_keys is None:
+        return EntryStore()
+    return DenseEntryStore(scheme.num_keys)
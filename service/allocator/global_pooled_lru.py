@@ -1,4 +1,5 @@
-from typing import Tuple
+from typing import Tuple, Dict, List
+from collections import defaultdict
 
 from service.scheme import CacheScheme
 from service.allocator.abstract import Allocator
@@ -7,27 +8,57 @@ from service.allocator.lru import LRULinkedList
 
 class GlobalPooledLRU(Allocator):
     def __init__(self, scheme: CacheScheme) -> None:
+        super().__init__(scheme)
         self.name = "GlobalLRU"
-        self.scheme = scheme
 
-        self.cache = LRULinkedList()
+        self.cache = LRULinkedList(self.entries, scheme.clock)
+        self.tenant_used: Dict[str, int] = defaultdict(int)
 
     def key_in_cache(self, tntid, key) -> bool:
         """ return whether key is in cache """
         return self.cache.key_in_cache(tntid, key)
 
-    def cache_isfull(self) -> bool:
-        """ return whether cache is full """
-        return self.cache.cache_cnt >= self.scheme.cache_size
+    def cache_isfull(self, val_size) -> bool:
+        """ return whether cache has no room for an entry of val_size """
+        return self.cache.used + self._charge(val_size) > self.scheme.cache_size
 
     def inform_use(self, tntid, key) -> None:
         """ called when a key is read or updated; only update last use ts """
         self.cache.inform_use(tntid, key)
 
-    def inform_set(self, tntid, key, ttl) -> None:
+    def inform_set(self, tntid, key, ttl, val_size) -> None:
         """ called when a new key is brought into cache """
-        self.cache.inform_set(tntid, key, ttl)
+        size = self._charge(val_size)
+        slot = self.cache.inform_set(tntid, key, size)
+        self.tenant_used[tntid] += size
+        self._schedule_expiry(slot, ttl)
 
-    def arbit_evict(self, tntid, key) -> Tuple[str, str]:
+    @property
+    def cache_used(self) -> int:
+        return self.cache.used
+
+    def inform_resize(self, tntid, key, val_size) -> List[Tuple[str, str]]:
+        """ called when a cached key is set again """
+        slot, size = self.get_entry(tntid, key), self._charge(val_size)
+        if size == self.entries.size[slot]:
+            return []
+        self.tenant_used[tntid] += size - self.entries.size[slot]
+        self.cache.resize(slot, size)
+        return self._evict_overfull(tntid, key, val_size)
+
+    def remove(self, tntid, key) -> None:
+        """ called when a key leaves cache other than by eviction """
+        self.tenant_used[tntid] -= self.entries.size[self.get_entry(tntid, key)]
+        self.cache.remove(tntid, key)
+
+    def arbit_evict(self, tntid, key, val_size) -> Tuple[str, str]:
         """ called when a new key should be brought in and cache is full """
+        slot = self.cache.oldest()
+        etntid = self.entries.tntid(slot)
+        self.tenant_used[etntid] -= self.entries.size[slot]
+        if self.metrics is not None:
+            self.metrics.count("evict_self" if etntid == tntid else "evict_other")
         return self.cache.arbit_evict(tntid, key)
+
+    def tenant_usage(self) -> Dict[str, int]:
+        return dict(self.tenant_used)
@@ -1,77 +1,83 @@
 import time
 from typing import Optional, Tuple
 
-from service.scheme import CacheScheme
-from service.allocator.abstract import Allocator
-
-
-class CacheObject:
-    def __init__(self, tntid, key, create_time, ttl) -> None:
-        self.tntid = tntid
-        self.key = key
-        self.last_used = create_time
-        self.ttl = ttl
-
-        self.pre: CacheObject = None
-        self.next: CacheObject = None
+from service.allocator.entrystore import EntryStore
 
 
 class LRULinkedList:
-    def __init__(self) -> None:
+    """ LRU list of entries kept in an EntryStore, most recent first;
+    several lists may share one store """
+
+    def __init__(self, entries: EntryStore, clock=time.time) -> None:
         self.name = "LRULinkedList"
+        self.entries = entries
+        self.clock = clock
         self.cache_cnt = 0
-        self.head = CacheObject(None, None, None, None)
-        self.tail = CacheObject(None, None, None, None)
-        self.head.next = self.tail
-        self.tail.pre = self.head
+        self.used = 0  # sum of entry sizes
+        self.head = entries.new_list()
 
-    def _get_ptr(self, tntid, key) -> CacheObject:
-        ptr: CacheObject = self.head
-        while ptr is not None:
-            if ptr.tntid == tntid and ptr.key == key:
-                return ptr
-            ptr = ptr.next
-        return None
+    def get_entry(self, tntid, key) -> Optional[int]:
+        return self.entries.find(tntid, key)
 
     def key_in_cache(self, tntid, key) -> bool:
         """ return whether key is in cache """
-        return self._get_ptr(tntid, key) is not None
-
-    def _insert_front(self, co: CacheObject) -> None:
-        co.pre = self.head
-        co.next = self.head.next
-        co.pre.next = co
-        co.next.pre = co
+        return self.entries.find(tntid, key) is not None
 
     def inform_use(self, tntid, key) -> None:
         """ called when a key is read or updated; only update last use ts """
-        ptr = self._get_ptr(tntid, key)
-        assert ptr is not None
-        ptr.last_used = time.time()
-        ptr.pre.next = ptr.next
-        ptr.next.pre = ptr.pre
-        self._insert_front(ptr)
+        entries = self.entries
+        slot = entries.find(tntid, key)
+        assert slot is not None
+        entries.last_used[slot] = self.clock()
+        entries.move_front(self.head, slot)
 
-    def inform_set(self, tntid, key, ttl) -> None:
-        """ called when a new key is brought into cache """
+    def inform_set(self, tntid, key, size=1, status=0) -> int:
+        """ called when a new key is brought into cache; return its slot """
         self.cache_cnt += 1
-        co = CacheObject(tntid, key, time.time(), ttl)
-        self._insert_front(co)
+        self.used += size
+        slot = self.entries.alloc(tntid, key, self.clock(), size, status)
+        self.entries.push_front(self.head, slot)
+        return slot
+
+    def detach(self, slot) -> None:
+        """ unlink a live entry without freeing it, e.g. to move it """
+        self.entries.unlink(slot)
+        self.cache_cnt -= 1
+        self.used -= self.entries.size[slot]
+
+    def attach(self, slot) -> None:
+        """ link a detached entry in as most recent """
+        self.entries.push_front(self.head, slot)
+        self.cache_cnt += 1
+        self.used += self.entries.size[slot]
+
+    def resize(self, slot, size) -> None:
+        self.used += size - self.entries.size[slot]
+        self.entries.size[slot] = size
+
+    def remove(self, tntid, key) -> None:
+        """ unlink key wherever it is in the list """
+        slot = self.entries.find(tntid, key)
+        self.entries.unlink(slot)
+        self.cache_cnt -= 1
+        self.used -= self.entries.size[slot]
+        self.entries.release(slot)
 
     def arbit_evict(self, tntid, key) -> Tuple[str, str]:
         """ called when a new key should be brought in and cache is full """
+        last = self.entries.back(self.head)
+        assert last is not None
         self.cache_cnt -= 1
-        last = self.tail.pre
-        assert last.tntid is not None and last.key is not None
-        last.pre.next = last.next
-        last.next.pre = last.pre
-        evict_tntid = last.tntid
-        evict_key = last.key
-        del last
+        self.used -= self.entries.size[last]
+        self.entries.unlink(last)
+        evict_tntid = self.entries.tntid(last)
+        evict_key = self.entries.keys[last]
+        self.entries.release(last)
         return evict_tntid, evict_key
 
+    def oldest(self) -> Optional[int]:
+        return self.entries.back(self.head)
+
     def oldest_time(self) -> Optional[float]:
-        co = self.tail.pre
-        if co is self.head:
-            return None
-        return co.last_used
+        slot = self.entries.back(self.head)
+        return None if slot is None else self.entries.last_used[slot]
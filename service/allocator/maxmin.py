@@ -1,4 +1,5 @@
-from typing import Tuple, Dict
+import heapq
+from typing import Tuple, Dict, List
 from collections import defaultdict
 
 from service.scheme import CacheScheme
@@ -8,35 +9,84 @@ from service.allocator.lru import LRULinkedList
 
 class Maxmin(Allocator):
     def __init__(self, scheme: CacheScheme) -> None:
+        super().__init__(scheme)
         self.name = "Max-Min"
-        self.scheme = scheme
 
-        self.cache: Dict[str, LRULinkedList] = defaultdict(LRULinkedList)
+        self.cache: Dict[str, LRULinkedList] = defaultdict(lambda: LRULinkedList(self.entries, scheme.clock))
+        self.cache_used = 0
+
+        # lazily invalidated max-heap of (-used, rank, tntid); rank is
+        # first-seen order so ties go to the earliest tenant, as a scan would
+        self.ranks: Dict[str, int] = {}
+        self.most_use_heap: List[Tuple[int, int, str]] = []
+
+    def _rank(self, tntid) -> int:
+        return self.ranks.setdefault(tntid, len(self.ranks))
+
+    def _push_cnt(self, tntid) -> None:
+        heapq.heappush(self.most_use_heap,
+                       (-self.cache[tntid].used, self._rank(tntid), tntid))
+        if len(self.most_use_heap) > 2 * len(self.ranks) + 64:
+            self.most_use_heap = [item for item in self.most_use_heap
+                                  if -item[0] == self.cache[item[2]].used]
+            heapq.heapify(self.most_use_heap)
+
+    def _most_use_tenant(self):
+        popped = 0
+        while -self.most_use_heap[0][0] != self.cache[self.most_use_heap[0][2]].used:
+            heapq.heappop(self.most_use_heap)
+            popped += 1
+        if self.metrics is not None:
+            self.metrics.scan("stale_heap_pops", popped)
+        return self.most_use_heap[0][2]
 
     def key_in_cache(self, tntid, key) -> bool:
         """ return whether key is in cache """
+        self._rank(tntid)
         return self.cache[tntid].key_in_cache(tntid, key)
 
-    def cache_isfull(self) -> bool:
-        """ return whether cache is full """
-        cache_cnt = sum([c.cache_cnt for _, c in self.cache.items()])
-        return cache_cnt >= self.scheme.cache_size
+    def cache_isfull(self, val_size) -> bool:
+        """ return whether cache has no room for an entry of val_size """
+        return self.cache_used + self._charge(val_size) > self.scheme.cache_size
 
     def inform_use(self, tntid, key) -> None:
         """ called when a key is read or updated; only update last use ts """
         self.cache[tntid].inform_use(tntid, key)
 
-    def inform_set(self, tntid, key, ttl) -> None:
+    def inform_set(self, tntid, key, ttl, val_size) -> None:
         """ called when a new key is brought into cache """
-        self.cache[tntid].inform_set(tntid, key, ttl)
+        size = self._charge(val_size)
+        slot = self.cache[tntid].inform_set(tntid, key, size)
+        self.cache_used += size
+        self._push_cnt(tntid)
+        self._schedule_expiry(slot, ttl)
 
-    def arbit_evict(self, tntid, key) -> Tuple[str, str]:
+    def inform_resize(self, tntid, key, val_size) -> List[Tuple[str, str]]:
+        """ called when a cached key is set again """
+        slot, size = self.get_entry(tntid, key), self._charge(val_size)
+        if size == self.entries.size[slot]:
+            return []
+        self.cache_used += size - self.entries.size[slot]
+        self.cache[tntid].resize(slot, size)
+        self._push_cnt(tntid)
+        return self._evict_overfull(tntid, key, val_size)
+
+    def remove(self, tntid, key) -> None:
+        """ called when a key leaves cache other than by eviction """
+        self.cache_used -= self.entries.size[self.get_entry(tntid, key)]
+        self.cache[tntid].remove(tntid, key)
+        self._push_cnt(tntid)
+
+    def arbit_evict(self, tntid, key, val_size) -> Tuple[str, str]:
         """ called when a new key should be brought in and cache is full """
-        most_use_tenant = None
-        most_use_cnt = 0
-        assert len(self.cache)
-        for tntid, cache in self.cache.items():
-            if most_use_tenant is None or cache.cache_cnt > most_use_cnt:
-                most_use_cnt = cache.cache_cnt
-                most_use_tenant = tntid
-        return self.cache[most_use_tenant].arbit_evict(tntid, key)
+        assert self.most_use_heap
+        most_use_tenant = self._most_use_tenant()
+        if self.metrics is not None:
+            self.metrics.count("evict_self" if most_use_tenant == tntid else "evict_other")
+        self.cache_used -= self.entries.size[self.cache[most_use_tenant].oldest()]
+        etntid, ekey = self.cache[most_use_tenant].arbit_evict(tntid, key)
+        self._push_cnt(most_use_tenant)
+        return etntid, ekey
+
+    def tenant_usage(self) -> Dict[str, int]:
+        return {t: c.used for t, c in self.cache.items()}
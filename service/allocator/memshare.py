@@ -1,19 +1,27 @@
-import random
+import heapq
 from typing import Tuple, Dict, List
 from collections import defaultdict
 
 from service.scheme import CacheScheme
 from service.allocator.abstract import Allocator
 from service.allocator.lru import LRULinkedList
+from service.allocator.victimq import VictimQueue
 
 
 class Memshare(Allocator):
     def __init__(self, scheme: CacheScheme) -> None:
+        super().__init__(scheme)
         self.name = "Memshare"
-        self.scheme = scheme
 
-        self.victim_qs: Dict[str, List[str]] = defaultdict(list)
-        self.cache: Dict[str, LRULinkedList] = defaultdict(LRULinkedList)
+        self.victim_qs: Dict[str, VictimQueue] = defaultdict(VictimQueue)
+        self.cache: Dict[str, LRULinkedList] = defaultdict(lambda: LRULinkedList(self.entries, scheme.clock))
+        self.cache_used = 0
+
+        # lazily invalidated min-heap of (oldest_time, tntid, version) over
+        # tenants holding more than guar_size
+        self.oldest_heap: List[Tuple[float, str, int]] = []
+        self.oldest_versions: Dict[str, int] = defaultdict(int)
+        self.oldest_times: Dict[str, float] = {}
 
     @property
     def guar_size(self):
@@ -25,40 +33,106 @@ class Memshare(Allocator):
         """ return whether key is in cache """
         return self.cache[tntid].key_in_cache(tntid, key)
 
-    def cache_isfull(self) -> bool:
-        """ return whether cache is full """
-        cache_cnt = sum([c.cache_cnt for _, c in self.cache.items()])
-        return cache_cnt >= self.scheme.cache_size
+    def cache_isfull(self, val_size) -> bool:
+        """ return whether cache has no room for an entry of val_size """
+        return self.cache_used + self._charge(val_size) > self.scheme.cache_size
 
     def inform_use(self, tntid, key) -> None:
         """ called when a key is read or updated; only update last use ts """
         self.cache[tntid].inform_use(tntid, key)
+        self._refresh_oldest(tntid)
 
-    def inform_set(self, tntid, key, ttl) -> None:
+    def inform_set(self, tntid, key, ttl, val_size) -> None:
         """ called when a new key is brought into cache """
-        self.cache[tntid].inform_set(tntid, key, ttl)
+        size = self._charge(val_size)
+        slot = self.cache[tntid].inform_set(tntid, key, size)
+        self.cache_used += size
+        self._refresh_oldest(tntid)
+        self._schedule_expiry(slot, ttl)
+
+    def inform_resize(self, tntid, key, val_size) -> List[Tuple[str, str]]:
+        """ called when a cached key is set again """
+        slot, size = self.get_entry(tntid, key), self._charge(val_size)
+        if size == self.entries.size[slot]:
+            return []
+        self.cache_used += size - self.entries.size[slot]
+        self.cache[tntid].resize(slot, size)
+        self._refresh_oldest(tntid)
+        return self._evict_overfull(tntid, key, val_size)
+
+    def remove(self, tntid, key) -> None:
+        """ called when a key leaves cache other than by eviction;
+        expired keys were not victimized, so they skip the victim queue """
+        self.cache_used -= self.entries.size[self.get_entry(tntid, key)]
+        self.cache[tntid].remove(tntid, key)
+        self._refresh_oldest(tntid)
 
     def _append_vq(self, tntid, key) -> None:
-        self.victim_qs[tntid].append(key)
         # victim q has same len as guaranteed
-        if len(self.victim_qs[tntid]) > self.guar_size:
-            self.victim_qs[tntid] = self.victim_qs[tntid][1:]
+        self.victim_qs[tntid].append(key, self.guar_size)
+
+    def _refresh_oldest(self, tntid) -> None:
+        """ re-key tenant in oldest_heap after its list changed """
+        c = self.cache[tntid]
+        lut = c.oldest_time() if c.used > self.guar_size else None
+        if self.oldest_times.get(tntid) == lut:
+            return
+        self.oldest_versions[tntid] += 1
+        if lut is None:
+            del self.oldest_times[tntid]
+            return
+        self.oldest_times[tntid] = lut
+        heapq.heappush(self.oldest_heap,
+                       (lut, tntid, self.oldest_versions[tntid]))
+        if len(self.oldest_heap) > 2 * len(self.oldest_times) + 64:
+            self.oldest_heap = [item for item in self.oldest_heap
+                                if self._valid_oldest(item)]
+            heapq.heapify(self.oldest_heap)
+
+    def _valid_oldest(self, item) -> bool:
+        return item[2] == self.oldest_versions[item[1]] and item[1] in self.oldest_times
 
-    def arbit_evict(self, tntid, key) -> Tuple[str, str]:
+    def _peek_oldest(self):
+        popped = 0
+        while self.oldest_heap and not self._valid_oldest(self.oldest_heap[0]):
+            heapq.heappop(self.oldest_heap)
+            popped += 1
+        if self.metrics is not None:
+            self.metrics.scan("stale_heap_pops", popped)
+        return self.oldest_heap[0] if self.oldest_heap else None
+
+    def _victim_tenant(self, tntid):
+        """ return over-guaranteed tenant other than tntid with oldest entry """
+        top = self._peek_oldest()
+        if top is None or top[1] != tntid:
+            return None if top is None else top[1]
+        heapq.heappop(self.oldest_heap)
+        second = self._peek_oldest()
+        heapq.heappush(self.oldest_heap, top)
+        return None if second is None else second[1]
+
+    def arbit_evict(self, tntid, key, val_size) -> Tuple[str, str]:
         """ called when a new key should be brought in and cache is full """
-        victen_cands = []
-        for t, c in self.cache.items():
-            if c.cache_cnt > self.guar_size and t != tntid:
-                lut = c.oldest_time()
-                assert lut is not None
-                victen_cands.append((lut, t))
-
-        if len(victen_cands) == 0 or (key not in self.victim_qs[tntid] and self.cache[tntid].cache_cnt > self.guar_size):
-            etntid, ekey = self.cache[tntid].arbit_evict(tntid, key)
-            self._append_vq(etntid, ekey)
-            return etntid, ekey
-
-        _, victim = sorted(victen_cands)[0]
+        victim = self._victim_tenant(tntid)
+
+        path = "evict_other"
+        if victim is None:
+            victim, path = tntid, "evict_self_no_other"
+        elif key not in self.victim_qs[tntid] and self.cache[tntid].used > self.guar_size:
+            victim, path = tntid, "evict_self_over_guar"
+        if self.cache[victim].cache_cnt == 0:
+            # only with byte capacity: nobody is over guarantee, yet the
+            # incoming value does not fit; take from the largest holder
+            victim = max(self.cache, key=lambda t: self.cache[t].used)
+            path = "evict_largest"
+        if self.metrics is not None:
+            self.metrics.count(path)
+
+        self.cache_used -= self.entries.size[self.cache[victim].oldest()]
         etntid, ekey = self.cache[victim].arbit_evict(tntid, key)
+        self._refresh_oldest(victim)
         self._append_vq(etntid, ekey)
         return etntid, ekey
+
+    def tenant_usage(self) -> Dict[str, int]:
+        return {t: c.used for t, c in self.cache.items()}
@@ -0,0 +1,81 @@
+import os
+from array import array
+from collections import defaultdict
+from typing import Dict
+
+import pandas as pd
+
+from service.scheme import CacheScheme
+from service.latency import LogHistogram
+
+
+class OccupancyRing:
+    """ last capacity samples of per-tenant cache usage, in a ring of
+    preallocated arrays; a tenant first seen later reads 0 before that """
+
+    def __init__(self, capacity) -> None:
+        self.capacity = capacity
+        self.ts = array("d", [0.0]) * capacity
+        self.used: Dict[object, array] = {}
+        self.n = 0  # samples taken, including overwritten ones
+
+    def sample(self, ts, usage: Dict) -> None:
+        i = self.n % self.capacity
+        self.ts[i] = ts
+        for tntid in usage:
+            if tntid not in self.used:
+                self.used[tntid] = array("q", [0]) * self.capacity
+        for tntid, used in self.used.items():
+            used[i] = usage.get(tntid, 0)
+        self.n += 1
+
+    def frame(self) -> pd.DataFrame:
+        """ columns ts, tntid, used; oldest retained sample first """
+        idx = [i % self.capacity for i in range(max(0, self.n - self.capacity), self.n)]
+        ts = [self.ts[i] for i in idx]
+        frames = [pd.DataFrame({"ts": ts, "tntid": tntid, "used": [used[i] for i in idx]})
+                  for tntid, used in self.used.items()]
+        if not frames:
+            return pd.DataFrame(columns=["ts", "tntid", "used"])
+        return pd.concat(frames, ignore_index=True)
+
+
+class AllocatorMetrics:
+    """ decision-path counters, scan-length histograms and an occupancy
+    ring of one allocator; allocators hold None instead when disabled """
+
+    def __init__(self, scheme: CacheScheme) -> None:
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.scans: Dict[str, LogHistogram] = defaultdict(LogHistogram)
+        self.occupancy = OccupancyRing(scheme.occupancy_samples)
+        self.interval = scheme.occupancy_interval
+        self.next_sample = None
+
+    def count(self, name, n=1) -> None:
+        self.counters[name] += n
+
+    def scan(self, name, length) -> None:
+        """ record how many items a decision looked at """
+        self.scans[name].record(length)
+
+    def due(self, now) -> bool:
+        return self.next_sample is None or now >= self.next_sample
+
+    def sample(self, now, usage: Dict) -> None:
+        self.occupancy.sample(now, usage)
+        self.next_sample = now + self.interval
+
+    def decisions_frame(self) -> pd.DataFrame:
+        """ one row per counter (kind "count") and per scan histogram """
+        rows = [{"metric": name, "kind": "count", "count": n}
+                for name, n in sorted(self.counters.items())]
+        rows += [{"metric": name, "kind": "scan", "count": h.total, "mean": h.mean(),
+                  "p99": h.percentile(99), "max": h.max}
+                 for name, h in sorted(self.scans.items())]
+        return pd.DataFrame(rows, columns=["metric", "kind", "count", "mean", "p99", "max"])
+
+    def save(self, dst: str) -> None:
+        """ write *_decisions.csv and *_occupancy.csv next to result file dst """
+        base = os.path.splitext(dst)[0]
+        self.decisions_frame().to_csv(base + "_decisions.csv", index=False)
+        self.occupancy.frame().to_csv(base + "_occupancy.csv", index=False)
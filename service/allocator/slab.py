@@ -0,0 +1,37 @@
+import bisect
+from typing import List
+
+from service.scheme import CacheScheme
+
+
+class SlabClasses:
+    """ memcached-style slab classes: chunk sizes grow by growth_factor from
+    min_chunk, 8-byte aligned, and the last class holds max_chunk. a value is
+    stored in the smallest chunk that fits it; larger values are chained
+    and charged their own size """
+
+    ALIGN = 8
+
+    def __init__(self, min_chunk, max_chunk, growth_factor) -> None:
+        self.chunk_sizes: List[int] = []
+        size = min_chunk
+        while size < max_chunk / growth_factor:
+            self.chunk_sizes.append(size)
+            size = int(size * growth_factor)
+            size += -size % self.ALIGN
+        self.chunk_sizes.append(max_chunk)
+
+    def __len__(self) -> int:
+        return len(self.chunk_sizes)
+
+    def class_of(self, val_size) -> int:
+        """ index of the slab class storing a value of val_size """
+        return min(bisect.bisect_left(self.chunk_sizes, val_size), len(self.chunk_sizes) - 1)
+
+    def chunk_size(self, val_size) -> int:
+        """ bytes a value of val_size occupies """
+        return max(self.chunk_sizes[self.class_of(val_size)], val_size)
+
+
+def create_slab_classes(scheme: CacheScheme) -> SlabClasses:
+    return SlabClasses(scheme.slab_min_chunk, scheme.slab_max_chunk, scheme.slab_growth_factor)
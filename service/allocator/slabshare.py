@@ -0,0 +1,205 @@
+import heapq
+from typing import Tuple, Dict, List, Set
+from collections import defaultdict
+
+from service.scheme import CacheScheme
+from service.allocator.abstract import Allocator
+from service.allocator.lru import LRULinkedList
+
+
+class SlabShare(Allocator):
+    """ memcached-style slab allocation shared by tenants: every tenant keeps
+    one LRU per slab class, and a new value evicts from its own class first,
+    as memcached does. guarantees are in units of cache_size, so they are
+    bytes with capacity "bytes" or "slabs" (the intended setting) """
+
+    def __init__(self, scheme: CacheScheme) -> None:
+        super().__init__(scheme)
+        self.name = "SlabShare"
+
+        # cache[tntid][slab class]; an entry's status is its slab class
+        self.cache: Dict[str, Dict[int, LRULinkedList]] = defaultdict(
+            lambda: defaultdict(lambda: LRULinkedList(self.entries, scheme.clock)))
+        self.cache_used = 0
+        self.tenant_used: Dict[str, int] = defaultdict(int)
+        self.over_guar: Set[str] = set()  # tenants holding more than guar_size
+
+        # per slab class, lazily invalidated min-heap of (tail last use,
+        # tntid, version) over the LRUs of over-guaranteed tenants, as
+        # Memshare's oldest_heap; all_heap holds the same tails across
+        # classes as (tail last use, tntid, class, version)
+        self.oldest_heaps: Dict[int, List[Tuple[float, str, int]]] = defaultdict(list)
+        self.all_heap: List[Tuple[float, str, int, int]] = []
+        self.oldest_times: Dict[int, Dict[str, float]] = defaultdict(dict)
+        self.oldest_versions: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.num_tails = 0
+
+    @property
+    def guar_size(self):
+        return max(1, int(self.scheme.cache_size
+                   / self.scheme.num_tenants
+                   * self.scheme.guarantee_ratio))
+
+    def _add_tenant_used(self, tntid, delta) -> None:
+        self.cache_used += delta
+        used = self.tenant_used[tntid] + delta
+        self.tenant_used[tntid] = used
+        if (used > self.guar_size) == (tntid in self.over_guar):
+            return
+        if used > self.guar_size:
+            self.over_guar.add(tntid)
+        else:
+            self.over_guar.discard(tntid)
+        for cls in self.cache[tntid]:
+            self._refresh_oldest(tntid, cls)
+
+    def key_in_cache(self, tntid, key) -> bool:
+        """ return whether key is in cache """
+        return self.entries.find(tntid, key) is not None
+
+    def cache_isfull(self, val_size) -> bool:
+        """ return whether cache has no room for an entry of val_size """
+        return self.cache_used + self._charge(val_size) > self.scheme.cache_size
+
+    def inform_use(self, tntid, key) -> None:
+        """ called when a key is read or updated; only update last use ts """
+        cls = self.entries.status[self.entries.find(tntid, key)]
+        self.cache[tntid][cls].inform_use(tntid, key)
+        self._refresh_oldest(tntid, cls)
+
+    def inform_set(self, tntid, key, ttl, val_size) -> None:
+        """ called when a new key is brought into cache """
+        cls = self.slabs.class_of(val_size)
+        size = self._charge(val_size)
+        slot = self.cache[tntid][cls].inform_set(tntid, key, size, status=cls)
+        self._add_tenant_used(tntid, size)
+        self._refresh_oldest(tntid, cls)
+        self._schedule_expiry(slot, ttl)
+
+    def inform_resize(self, tntid, key, val_size) -> List[Tuple[str, str]]:
+        """ called when a cached key is set again; as memcached, the new
+        value's chunk is made room for in its class before the old one is
+        let go, so the key is never its own victim """
+        slot, size = self.get_entry(tntid, key), self._charge(val_size)
+        cls = self.slabs.class_of(val_size)
+        old_cls = self.entries.status[slot]
+        if size == self.entries.size[slot] and cls == old_cls:
+            return []
+        self.cache[tntid][old_cls].detach(slot)
+        self._add_tenant_used(tntid, -self.entries.size[slot])
+        self._refresh_oldest(tntid, old_cls)
+        evicted = []
+        while self.cache_isfull(val_size):
+            evicted.append(self.arbit_evict(tntid, key, val_size))
+        self.entries.size[slot] = size
+        self.entries.status[slot] = cls
+        self.cache[tntid][cls].attach(slot)
+        self._add_tenant_used(tntid, size)
+        self._refresh_oldest(tntid, cls)
+        return evicted
+
+    def remove(self, tntid, key) -> None:
+        """ called when a key leaves cache other than by eviction """
+        slot = self.get_entry(tntid, key)
+        cls = self.entries.status[slot]
+        self._add_tenant_used(tntid, -self.entries.size[slot])
+        self.cache[tntid][cls].remove(tntid, key)
+        self._refresh_oldest(tntid, cls)
+
+    def _refresh_oldest(self, tntid, cls) -> None:
+        """ re-key tenant's LRU of cls in the heaps after its tail or the
+        tenant's over-guarantee state may have changed """
+        lut = self.cache[tntid][cls].oldest_time() if tntid in self.over_guar else None
+        times = self.oldest_times[cls]
+        if times.get(tntid) == lut:
+            return
+        versions = self.oldest_versions[cls]
+        versions[tntid] += 1
+        if lut is None:
+            del times[tntid]
+            self.num_tails -= 1
+            return
+        if tntid not in times:
+            self.num_tails += 1
+        times[tntid] = lut
+        heap = self.oldest_heaps[cls]
+        heapq.heappush(heap, (lut, tntid, versions[tntid]))
+        heapq.heappush(self.all_heap, (lut, tntid, cls, versions[tntid]))
+        # drop stale items once they outnumber live ones
+        if len(heap) > 2 * len(times) + 64:
+            heap[:] = [item for item in heap if self._valid_oldest(item[1], cls, item[2])]
+            heapq.heapify(heap)
+        if len(self.all_heap) > 2 * self.num_tails + 64:
+            self.all_heap = [item for item in self.all_heap if self._valid_oldest(item[1], item[2], item[3])]
+            heapq.heapify(self.all_heap)
+
+    def _valid_oldest(self, tntid, cls, version) -> bool:
+        return version == self.oldest_versions[cls][tntid] and tntid in self.oldest_times[cls]
+
+    def _peek_oldest(self, cls):
+        """ top of oldest_heaps[cls], or of all_heap if cls is None """
+        heap = self.all_heap if cls is None else self.oldest_heaps[cls]
+        popped = 0
+        while heap:
+            item = heap[0]
+            if cls is None:
+                valid = self._valid_oldest(item[1], item[2], item[3])
+            else:
+                valid = self._valid_oldest(item[1], cls, item[2])
+            if valid:
+                break
+            heapq.heappop(heap)
+            popped += 1
+        if self.metrics is not None:
+            self.metrics.scan("stale_heap_pops", popped)
+        return heap[0] if heap else None
+
+    def _victim_tenant(self, tntid, cls):
+        """ over-guaranteed tenant other than tntid with the oldest tail in cls """
+        top = self._peek_oldest(cls)
+        if top is None or top[1] != tntid:
+            return None if top is None else top[1]
+        heap = self.oldest_heaps[cls]
+        heapq.heappop(heap)
+        second = self._peek_oldest(cls)
+        heapq.heappush(heap, top)
+        return None if second is None else second[1]
+
+    def _largest_holder_lru(self, cls) -> LRULinkedList:
+        """ nobody is over guarantee; the largest holder's LRU of cls, or
+        else its LRU with the oldest tail """
+        lrus = self.cache[max(self.tenant_used, key=self.tenant_used.get)]
+        if cls in lrus and lrus[cls].cache_cnt:
+            return lrus[cls]
+        held = [lru for lru in lrus.values() if lru.cache_cnt]
+        return min(held, key=lambda lru: lru.oldest_time())
+
+    def arbit_evict(self, tntid, key, val_size) -> Tuple[str, str]:
+        """ called when a new key should be brought in and cache is full """
+        cls = self.slabs.class_of(val_size)
+        # same class of an over-guaranteed tenant, then the inserting
+        # tenant's own when it is over guarantee; moving capacity across
+        # classes (memcached's slab reassignment) comes after
+        path, victim = "evict_other_class", self._victim_tenant(tntid, cls)
+        victim_cls = cls
+        if victim is None and tntid in self.oldest_times[cls]:
+            path, victim = "evict_own_class", tntid
+        if victim is None:
+            top = self._peek_oldest(None)
+            if top is not None:
+                path, victim, victim_cls = "evict_reassign", top[1], top[2]
+        if victim is None:
+            path, lru = "evict_largest", self._largest_holder_lru(cls)
+        else:
+            lru = self.cache[victim][victim_cls]
+        if self.metrics is not None:
+            self.metrics.count(path)
+        slot = lru.oldest()
+        etntid, ecls = self.entries.tntid(slot), self.entries.status[slot]
+        self._add_tenant_used(etntid, -self.entries.size[slot])
+        evicted = lru.arbit_evict(tntid, key)
+        self._refresh_oldest(etntid, ecls)
+        return evicted
+
+    def tenant_usage(self) -> Dict[str, int]:
+        return dict(self.tenant_used)
@@ -0,0 +1,75 @@
+import math
+from typing import List, Optional, Tuple
+
+
+class TimingWheel:
+    """ hierarchical timing wheel: level l has wheel_size slots of
+    tick * wheel_size**l seconds each. an item is filed at the coarsest
+    level its delay needs and cascades down as time reaches its slot, so
+    add is O(1) and each item moves at most num_levels times """
+
+    def __init__(self, tick, wheel_size=64, num_levels=4) -> None:
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.num_levels = num_levels
+        # levels[l][slot] -> [(expire_tick, item)]
+        self.levels: List[List[List[Tuple[int, object]]]] = [
+            [[] for _ in range(wheel_size)] for _ in range(num_levels)]
+        self.overflow: List[Tuple[int, object]] = []  # beyond the top level
+        self.due: List[object] = []
+        self.cur_tick: Optional[int] = None
+
+    def __len__(self) -> int:
+        return (sum(len(slot) for level in self.levels for slot in level)
+                + len(self.overflow) + len(self.due))
+
+    def add(self, item, expire_at, now) -> None:
+        """ fire item at the first tick at or after expire_at """
+        if self.cur_tick is None:
+            self.cur_tick = math.floor(now / self.tick)
+        self._file(math.ceil(expire_at / self.tick), item)
+
+    def _file(self, expire_tick, item) -> None:
+        delay = expire_tick - self.cur_tick
+        if delay <= 0:
+            self.due.append(item)
+            return
+        span = self.wheel_size
+        for level in range(self.num_levels):
+            if delay < span:
+                slot = (expire_tick * self.wheel_size // span) % self.wheel_size
+                self.levels[level][slot].append((expire_tick, item))
+                return
+            span *= self.wheel_size
+        self.overflow.append((expire_tick, item))
+
+    def _cascade(self, level) -> None:
+        if level == self.num_levels:
+            items, self.overflow = self.overflow, []
+        else:
+            slot = (self.cur_tick // self.wheel_size ** level) % self.wheel_size
+            items, self.levels[level][slot] = self.levels[level][slot], []
+        for expire_tick, item in items:
+            self._file(expire_tick, item)
+
+    def advance(self, now) -> List[object]:
+        """ move time to now; return items that expired, in tick order """
+        target = math.floor(now / self.tick)
+        if self.cur_tick is None:
+            self.cur_tick = target
+        expired, self.due = self.due, []
+        while self.cur_tick < target:
+            self.cur_tick += 1
+            # cascade coarse levels first so their items can land in the
+            # finer slots cascaded right after
+            top = 0
+            while top < self.num_levels and self.cur_tick % self.wheel_size ** (top + 1) == 0:
+                top += 1
+            for level in range(top, 0, -1):
+                self._cascade(level)
+            slot = self.cur_tick % self.wheel_size
+            expired.extend(item for _, item in self.levels[0][slot])
+            self.levels[0][slot] = []
+            expired.extend(self.due)
+            self.due = []
+        return expired
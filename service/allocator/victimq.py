@@ -0,0 +1,31 @@
+from collections import deque
+from typing import Deque, Dict
+
+
+class VictimQueue:
+    """ FIFO of recently evicted keys with O(1) membership test and trimming;
+    a key evicted twice is kept twice, exactly like the plain list it replaces """
+
+    def __init__(self) -> None:
+        self.q: Deque[str] = deque()
+        self.cnts: Dict[str, int] = {}
+
+    def __contains__(self, key) -> bool:
+        return key in self.cnts
+
+    def __len__(self) -> int:
+        return len(self.q)
+
+    def append(self, key, maxlen) -> None:
+        self.q.append(key)
+        self.cnts[key] = self.cnts.get(key, 0) + 1
+        if len(self.q) > maxlen:
+            self._popleft()
+
+    def _popleft(self) -> None:
+        key = self.q.popleft()
+        cnt = self.cnts[key] - 1
+        if cnt:
+            self.cnts[key] = cnt
+        else:
+            del self.cnts[key]
@@ -1,49 +1,109 @@
 import threading
-import redis
 
 from service.allocator.abstract import Allocator
+from service.storage import Storage, AsyncStorage
+from service.keylock import StripedKeyLock, AsyncStripedKeyLock
+from service.latency import LatencyRecorder, create_latency_clock
 
 
 class CacheClient:
-    def __init__(self, allocator: Allocator) -> None:
-        self.redis = redis.Redis(
-            host='localhost', port=6379, decode_responses=True)
+    def __init__(self, allocator: Allocator, storage: Storage) -> None:
+        self.storage = storage
         self.allocator = allocator
-        self.lock = threading.Lock()
+        self.lock = threading.Lock()  # guards allocator metadata only
+        self.key_lock = StripedKeyLock(allocator.scheme.key_lock_stripes)
+        self.wrapped_keys = allocator.scheme.wrapped_keys
+        self._init_latency(allocator.scheme.latency_breakdown)
+
+    def _init_latency(self, enabled) -> None:
+        self.latency = LatencyRecorder() if enabled else None
+        self.clock_ns = create_latency_clock(enabled)
 
     def reset(self):
-        self.redis.flushdb()
+        self.storage.reset()
 
-    def handle(self, tntid, key, val, iswrite, ttl) -> bool:
+    def handle(self, tntid, key, val, iswrite, ttl, val_size) -> bool:
         """ handle READ if val is None, else handle WRITE; return hit """
-        self.lock.acquire()
-        hit = self.allocator.key_in_cache(tntid, key)
-        if hit:
-            self.allocator.inform_use(tntid, key)
-            if iswrite:
-                self._write_redis(tntid, key, val)
+        now = self.clock_ns
+        wk = self._wrap_key(tntid, key)
+        t0 = now()
+        with self.lock:
+            t1 = now()
+            hit, write, dwks = self._decide(tntid, key, iswrite, ttl, val_size)
+            tickets = self.key_lock.take([wk] + dwks)
+        t2 = now()
+        # storage I/O runs outside the allocator lock, ordered per key
+        self.key_lock.acquire(tickets)
+        t3 = now()
+        try:
+            if write and dwks:
+                self.storage.replace(dwks, wk, val)
             else:
-                self._read_redis(tntid, key)
-        else:
-            if self.allocator.cache_isfull():
-                evict_tntid, evict_key = self.allocator.arbit_evict(tntid, key)
-                self._evict_redis(evict_tntid, evict_key)
-            self.allocator.inform_set(tntid, key, ttl)
-            self._write_redis(tntid, key, val)
-        self.lock.release()
+                for dwk in dwks:
+                    self.storage.delete(dwk)
+                if write:
+                    self.storage.set(wk, val)
+                elif hit:
+                    self.storage.get(wk)
+        finally:
+            self.key_lock.release(tickets)
+        if self.latency is not None:
+            self.latency.record(tntid, lock_wait=t1 - t0 + t3 - t2, allocator=t2 - t1,
+                                storage=now() - t3)
         return hit
 
-    def _read_redis(self, tntid, key) -> None:
-        wk = self._wrap_key(tntid, key)
-        self.redis.get(wk)
-
-    def _write_redis(self, tntid, key, val) -> None:
-        wk = self._wrap_key(tntid, key)
-        self.redis.set(wk, val)
-
-    def _evict_redis(self, tntid, key) -> None:
-        wk = self._wrap_key(tntid, key)
-        self.redis.delete(wk)
+    def _decide(self, tntid, key, iswrite, ttl, val_size):
+        """ run the allocator; return hit, whether to store val, and the
+        wrapped keys evicted or expired """
+        hit, evicted, expired = self.allocator.access(tntid, key, ttl, val_size, iswrite)
+        # a value larger than the cache is not stored, and a write hit may
+        # evict its own key to make room for a larger value
+        write = (iswrite or not hit) and self.allocator.key_in_cache(tntid, key)
+        return hit, write, [self._wrap_key(*x) for x in evicted + expired]
 
     def _wrap_key(self, tntid, key) -> str:
+        if self.wrapped_keys is not None:  # key is an interned pair id
+            return self.wrapped_keys[key]
         return f"{tntid}:{key}"
+
+
+class AsyncCacheClient(CacheClient):
+    """ CacheClient for one event loop; allocator calls never await,
+    so they need no lock """
+
+    def __init__(self, allocator: Allocator, storage: AsyncStorage) -> None:
+        self.storage = storage
+        self.allocator = allocator
+        self.key_lock = AsyncStripedKeyLock(allocator.scheme.key_lock_stripes)
+        self.wrapped_keys = allocator.scheme.wrapped_keys
+        self._init_latency(allocator.scheme.latency_breakdown)
+
+    async def reset(self):
+        await self.storage.reset()
+
+    async def handle(self, tntid, key, val, iswrite, ttl, val_size) -> bool:
+        """ handle READ if val is None, else handle WRITE; return hit """
+        now = self.clock_ns
+        wk = self._wrap_key(tntid, key)
+        t1 = now()
+        hit, write, dwks = self._decide(tntid, key, iswrite, ttl, val_size)
+        tickets = self.key_lock.take([wk] + dwks)
+        t2 = now()
+        await self.key_lock.acquire(tickets)
+        t3 = now()
+        try:
+            if write and dwks:
+                await self.storage.replace(dwks, wk, val)
+            else:
+                for dwk in dwks:
+                    await self.storage.delete(dwk)
+                if write:
+                    await self.storage.set(wk, val)
+                elif hit:
+                    await self.storage.get(wk)
+        finally:
+            await self.key_lock.release(tickets)
+        if self.latency is not None:
+            self.latency.record(tntid, lock_wait=t3 - t2, allocator=t2 - t1,
+                                storage=now() - t3)
+        return hit
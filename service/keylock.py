@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from typing import Dict, Iterable, List
+
+
+class StripedKeyLock:
+    """ per-key ordering for storage I/O done outside the allocator lock.
+    keys hash onto stripes; each stripe serves tickets in FIFO order.
+    tickets are taken while holding the allocator lock, so every stripe
+    sees operations in allocator decision order and waits never cycle """
+
+    def __init__(self, num_stripes) -> None:
+        self.num_stripes = num_stripes
+        self.conds = [self._new_cond() for _ in range(num_stripes)]
+        self.next_tickets: List[int] = [0] * num_stripes
+        self.serving: List[int] = [0] * num_stripes
+
+    def _new_cond(self):
+        return threading.Condition()
+
+    def stripe(self, wk) -> int:
+        return hash(wk) % self.num_stripes
+
+    def take(self, wks: Iterable[str]) -> Dict[int, int]:
+        """ return stripe -> ticket; call under the allocator lock """
+        tickets = {}
+        for wk in wks:
+            s = self.stripe(wk)
+            if s not in tickets:
+                tickets[s] = self.next_tickets[s]
+                self.next_tickets[s] += 1
+        return tickets
+
+    def acquire(self, tickets: Dict[int, int]) -> None:
+        for s, ticket in tickets.items():
+            cond = self.conds[s]
+            with cond:
+                while self.serving[s] != ticket:
+                    cond.wait()
+
+    def release(self, tickets: Dict[int, int]) -> None:
+        for s in tickets:
+            cond = self.conds[s]
+            with cond:
+                self.serving[s] += 1
+                cond.notify_all()
+
+
+class AsyncStripedKeyLock(StripedKeyLock):
+    """ StripedKeyLock for coroutines; take() right after the allocator
+    decision, with no await in between """
+
+    def _new_cond(self):
+        return asyncio.Condition()
+
+    async def acquire(self, tickets: Dict[int, int]) -> None:
+        for s, ticket in tickets.items():
+            cond = self.conds[s]
+            async with cond:
+                await cond.wait_for(lambda: self.serving[s] == ticket)
+
+    async def release(self, tickets: Dict[int, int]) -> None:
+        for s in tickets:
+            cond = self.conds[s]
+            async with cond:
+                self.serving[s] += 1
+                cond.notify_all()
@@ -0,0 +1,119 @@
+import os
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+PHASES = ["lock_wait", "allocator", "genval", "storage"]
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+class LogHistogram:
+    """ HDR-style histogram of non-negative integers: 2**(sub_bits-1) linear
+    sub-buckets per power of two, so any recorded value is known to within
+    2**(1-sub_bits) relative error at O(1) record cost """
+
+    def __init__(self, sub_bits=6) -> None:
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.counts: List[int] = []
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def _index(self, v) -> int:
+        shift = max(0, v.bit_length() - self.sub_bits)
+        return shift * self.half + (v >> shift)
+
+    def _lowest(self, idx) -> int:
+        """ smallest value falling in bucket idx """
+        if idx < 2 * self.half:
+            return idx
+        shift = idx // self.half - 1
+        return (idx - shift * self.half) << shift
+
+    def record(self, v) -> None:
+        idx = self._index(v)
+        if idx >= len(self.counts):
+            self.counts.extend([0] * (idx + 1 - len(self.counts)))
+        self.counts[idx] += 1
+        self.total += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def merge(self, other: "LogHistogram") -> None:
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for idx, cnt in enumerate(other.counts):
+            self.counts[idx] += cnt
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q) -> int:
+        """ lowest value of the bucket holding the q-th percentile """
+        if self.total == 0:
+            return 0
+        rank = max(1, -(-self.total * q // 100))
+        seen = 0
+        for idx, cnt in enumerate(self.counts):
+            seen += cnt
+            if seen >= rank:
+                return min(self._lowest(idx), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+
+class LatencyRecorder:
+    """ per-tenant, per-phase histograms of request time in ns. a tenant
+    has at most one request in flight, so its histograms are only ever
+    touched by one thread at a time """
+
+    def __init__(self) -> None:
+        self.hists: Dict[object, Dict[str, LogHistogram]] = {}
+
+    def record(self, tntid, **phases) -> None:
+        hists = self.hists.get(tntid)
+        if hists is None:
+            hists = self.hists.setdefault(tntid, {p: LogHistogram() for p in PHASES})
+        for phase, ns in phases.items():
+            hists[phase].record(ns)
+
+    def frame(self) -> pd.DataFrame:
+        """ one row per tenant and phase, plus the merge over tenants
+        as tntid "all"; times in us """
+        merged = {p: LogHistogram() for p in PHASES}
+        rows = []
+        for tntid, hists in list(self.hists.items()) + [("all", merged)]:
+            for phase in PHASES:
+                h = hists[phase]
+                if tntid != "all":
+                    merged[phase].merge(h)
+                row = {"tntid": tntid, "phase": phase, "count": h.total,
+                       "mean_us": h.mean() / 1e3, "max_us": h.max / 1e3}
+                for q in PERCENTILES:
+                    row[f"p{q}_us"] = h.percentile(q) / 1e3
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def save(self, dst: str) -> str:
+        """ write the breakdown next to result file dst; return its path """
+        path = latency_path(dst)
+        self.frame().to_csv(path, index=False)
+        return path
+
+
+def latency_path(dst: str) -> str:
+    return os.path.splitext(dst)[0] + "_latency.csv"
+
+
+def no_clock() -> int:
+    return 0
+
+
+def create_latency_clock(enabled):
+    """ ns clock for timing phases; free when the breakdown is off """
+    return time.perf_counter_ns if enabled else no_clock
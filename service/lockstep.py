@@ -0,0 +1,75 @@
+import copy
+import random
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from service.scheme import CacheScheme, BackingStoreScheme
+from service.allocator.abstract import Allocator
+
+
+class VirtualClock:
+    """ simulated time in seconds since trace start; injected as scheme.clock """
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class LockstepReplay:
+    """ feed one request stream to several allocators at once on a shared
+    virtual clock, with no storage I/O. every allocator sees each request
+    at the same ts, and a miss costs the same sampled backing store latency
+    in all of them, so their result frames differ only by decisions """
+
+    def __init__(self, cache_scheme: CacheScheme, allocator_classes: List[type],
+                 backingstore_scheme: BackingStoreScheme, seed=None) -> None:
+        self.clock = VirtualClock()
+        self.allocators: List[Allocator] = []
+        for allocator_class in allocator_classes:
+            scheme = copy.copy(cache_scheme)
+            scheme.allocator_class = allocator_class
+            scheme.clock = self.clock
+            self.allocators.append(allocator_class(scheme=scheme))
+        self.backingstore_scheme = backingstore_scheme
+        self.rng = random.Random(seed)
+
+        self.tntids: List = []
+        self.ts = array("d")
+        self.latencies = array("d")
+        self.hits = [bytearray() for _ in self.allocators]
+
+    def step(self, ts, tntid, key, ttl, val_size, iswrite=False) -> None:
+        self.clock.now = ts
+        self.tntids.append(tntid)
+        self.ts.append(ts)
+        self.latencies.append(self.backingstore_scheme.sample_latency(self.rng))
+        for allocator, hits in zip(self.allocators, self.hits):
+            hit, _, _ = allocator.access(tntid, key, ttl, val_size, iswrite)
+            hits.append(hit)
+
+    def run(self, requests: Iterable[Tuple]) -> None:
+        """ requests: (ts, tntid, key, ttl, val_size, iswrite) in ts order """
+        for ts, tntid, key, ttl, val_size, iswrite in requests:
+            self.step(ts, tntid, key, ttl, val_size, iswrite)
+
+    def frames(self) -> Dict[type, pd.DataFrame]:
+        """ allocator class -> result frame, with the columns of a replay's """
+        ts = np.frombuffer(self.ts, dtype=np.float64)
+        lat = np.frombuffer(self.latencies, dtype=np.float64)
+        tntids = np.asarray(self.tntids)
+        frames = {}
+        for allocator, hits in zip(self.allocators, self.hits):
+            hit = np.frombuffer(hits, dtype=np.bool_)
+            frames[type(allocator)] = pd.DataFrame({
+                "tntid": tntids,
+                "original_ts": ts,
+                "issue_ts": ts,
+                "finish_ts": ts + np.where(hit, 0, lat),
+                "hit": hit,
+            })
+        return frames
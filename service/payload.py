@@ -0,0 +1,98 @@
+import os
+import random
+from typing import Dict
+
+from service.scheme import CacheScheme
+
+
+class Payload:
+    def __init__(self, scheme: CacheScheme) -> None:
+        self.name = "AbstractPayload"
+        self.scheme = scheme
+
+    def get(self, byte_size):
+        """ return a value of byte_size bytes to store """
+        raise NotImplementedError("get")
+
+
+class RandomPayload(Payload):
+    """ fresh random letters per request; slow, kept for comparison """
+
+    def __init__(self, scheme: CacheScheme) -> None:
+        self.name = "Random"
+        self.scheme = scheme
+
+    def get(self, byte_size) -> str:
+        chars = [chr(random.randint(ord("a"), ord("z")))
+                 for _ in range(byte_size)]
+        return "".join(chars)
+
+
+class SlicePayload(Payload):
+    """ memoryview window at a random offset of one preallocated random buffer """
+
+    def __init__(self, scheme: CacheScheme) -> None:
+        self.name = "Slice"
+        self.scheme = scheme
+
+        self._alloc(scheme.payload_buffer_bytes)
+
+    def _alloc(self, nbytes) -> None:
+        self.buffer = memoryview(os.urandom(nbytes))
+
+    def get(self, byte_size) -> memoryview:
+        if byte_size > len(self.buffer):
+            self._alloc(max(byte_size, 2 * len(self.buffer)))
+        offset = random.randrange(len(self.buffer) - byte_size + 1)
+        return self.buffer[offset:offset + byte_size]
+
+
+class FixedPayload(SlicePayload):
+    """ prefix of one shared buffer; every value of a size is identical """
+
+    def __init__(self, scheme: CacheScheme) -> None:
+        super().__init__(scheme)
+        self.name = "Fixed"
+
+    def _alloc(self, nbytes) -> None:
+        self.buffer = memoryview(b"x" * nbytes)
+
+    def get(self, byte_size) -> memoryview:
+        if byte_size > len(self.buffer):
+            self._alloc(max(byte_size, 2 * len(self.buffer)))
+        return self.buffer[:byte_size]
+
+
+class SizeToken(bytes):
+    """ small stand-in value; val_size is what it accounts for """
+    val_size: int
+
+
+class SizePayload(Payload):
+    """ store only a token; MemoryStorage charges the logical val_size """
+
+    def __init__(self, scheme: CacheScheme) -> None:
+        self.name = "Size"
+        self.scheme = scheme
+
+        self.tokens: Dict[int, SizeToken] = {}
+
+    def get(self, byte_size) -> SizeToken:
+        token = self.tokens.get(byte_size)
+        if token is None:
+            token = SizeToken(b"%d" % byte_size)
+            token.val_size = byte_size
+            self.tokens[byte_size] = token
+        return token
+
+
+PAYLOADS = {
+    "random": RandomPayload,
+    "slice": SlicePayload,
+    "fixed": FixedPayload,
+    "size": SizePayload,
+}
+
+
+def create_payload(cache_scheme: CacheScheme) -> Payload:
+    return PAYLOADS[cache_scheme.payload](scheme=cache_scheme)
@@ -1,3 +1,9 @@
+import time
+import random
+
+import config
+
+
 class CacheScheme:
     def __init__(self, cache_ratio, cache_size, num_tenants, allocator_class) -> None:
         self.cache_ratio = cache_ratio
@@ -7,9 +13,36 @@ class CacheScheme:
 
         self.guarantee_ratio = 0.5
         self.smallq_size_ratio = 0.2
+        self.clock = time.time  # allocators read last use ts from here
+        self.storage = "redis"  # one of service.storage.STORAGES
+        self.storage_bytes = None  # byte budget of "memory" storage
+        self.wrapped_keys = None  # pair id -> storage key, for interned traces
+        self.num_keys = None  # number of pair ids when keys are interned, see EntryStore
+        self.payload = "slice"  # one of service.payload.PAYLOADS
+        self.payload_buffer_bytes = config.PAYLOAD_BUFFER_BYTES
+        self.redis_host = config.REDIS_HOST
+        self.redis_port = config.REDIS_PORT
+        self.redis_db = config.REDIS_DB
+        self.redis_pool_size = config.REDIS_POOL_SIZE
+        self.key_lock_stripes = config.KEY_LOCK_STRIPES
+        self.ttl_tick = config.TTL_TICK
+        self.latency_breakdown = config.LATENCY_BREAKDOWN  # per-phase request timing, see service/latency.py
+        self.allocator_metrics = config.ALLOCATOR_METRICS  # see service/allocator/metrics.py
+        self.occupancy_samples = config.OCCUPANCY_SAMPLES
+        self.occupancy_interval = config.OCCUPANCY_INTERVAL
+        # unit of cache_size: "objects", "bytes" of val_size, or "slabs",
+        # bytes with each value rounded up to its slab chunk
+        self.capacity = "objects"
+        self.slab_min_chunk = config.SLAB_MIN_CHUNK
+        self.slab_max_chunk = config.SLAB_MAX_CHUNK
+        self.slab_growth_factor = config.SLAB_GROWTH_FACTOR
 
 
 class BackingStoreScheme:
     def __init__(self, latency_mu, latency_sigma) -> None:
         self.latency_mu = latency_mu
         self.latency_sigma = latency_sigma
+
+    def sample_latency(self, rng=random) -> float:
+        """ return simulated latency of fetching data from backing store """
+        return max(0.2, rng.gauss(self.latency_mu, self.latency_sigma))
@@ -1,9 +1,10 @@
 import os
-import random
 import secrets
 from typing import Tuple
 
-from service.client import CacheClient
+from service.client import CacheClient, AsyncCacheClient
+from service.storage import create_storage, create_async_storage
+from service.payload import create_payload
 from service.scheme import CacheScheme, BackingStoreScheme
 from service.allocator.abstract import Allocator
 
@@ -14,7 +15,9 @@ def create_allocator(cache_scheme: CacheScheme) -> Allocator:
 
 class CacheServer:
     def __init__(self, cache_scheme: CacheScheme, backingstore_scheme: BackingStoreScheme) -> None:
-        self.cache_client = CacheClient(create_allocator(cache_scheme))
+        self.cache_client = CacheClient(create_allocator(cache_scheme),
+                                        create_storage(cache_scheme))
+        self.payload = create_payload(cache_scheme)
         self.backingstore_scheme = backingstore_scheme
 
         self.cache_client.reset()
@@ -22,17 +25,46 @@ class CacheServer:
     def request(self, tntid, key, iswrite=False, val_size=1024, ttl=0) -> Tuple[bool, float]:
         """ default write=False meaning GET request,
         return true if direct hit, false if fetching from backing store """
+        t0 = self.cache_client.clock_ns()
         val = self._genval(val_size)
-        hit = self.cache_client.handle(tntid, key, val, iswrite, ttl)
+        self._record_genval(tntid, t0)
+        hit = self.cache_client.handle(tntid, key, val, iswrite, ttl, val_size)
         additional_latency = 0 if hit else self._fetch(key)
         return hit, additional_latency
 
     def _fetch(self, _) -> float:
         """ return simulated latency of fetching data from backing store """
-        return max(0.2, random.gauss(self.backingstore_scheme.latency_mu,
-                                     self.backingstore_scheme.latency_sigma))
+        return self.backingstore_scheme.sample_latency()
 
-    def _genval(self, byte_size) -> str:
-        chars = [chr(random.randint(ord("a"), ord("z")))
-                 for _ in range(byte_size)]
-        return "".join(chars)
+    def _genval(self, byte_size):
+        return self.payload.get(byte_size)
+
+    def _record_genval(self, tntid, t0) -> None:
+        if self.cache_client.latency is not None:
+            self.cache_client.latency.record(tntid, genval=self.cache_client.clock_ns() - t0)
+
+    def save_latency(self, dst: str) -> None:
+        """ export the latency breakdown next to result file dst, if recorded """
+        if self.cache_client.latency is not None:
+            print("latency breakdown:", self.cache_client.latency.save(dst))
+
+
+class AsyncCacheServer(CacheServer):
+    def __init__(self, cache_scheme: CacheScheme, backingstore_scheme: BackingStoreScheme) -> None:
+        self.cache_client = AsyncCacheClient(create_allocator(cache_scheme),
+                                             create_async_storage(cache_scheme))
+        self.payload = create_payload(cache_scheme)
+        self.backingstore_scheme = backingstore_scheme
+
+    async def reset(self):
+        await self.cache_client.reset()
+
+    async def request(self, tntid, key, iswrite=False, val_size=1024, ttl=0) -> Tuple[bool, float]:
+        """ default write=False meaning GET request,
+        return true if direct hit, false if fetching from backing store """
+        t0 = self.cache_client.clock_ns()
+        val = self._genval(val_size)
+        self._record_genval(tntid, t0)
+        hit = await self.cache_client.handle(tntid, key, val, iswrite, ttl, val_size)
+        additional_latency = 0 if hit else self._fetch(key)
+        return hit, additional_latency
@@ -0,0 +1,230 @@
+import threading
+from typing import Dict, Optional
+
+from service.scheme import CacheScheme
+
+
+class Storage:
+    def __init__(self, scheme: CacheScheme) -> None:
+        self.name = "AbstractStorage"
+        self.scheme = scheme
+
+    def get(self, wk) -> Optional[str]:
+        """ return value stored under wrapped key, None if absent """
+        raise NotImplementedError("get")
+
+    def set(self, wk, val) -> None:
+        """ store value under wrapped key, overwriting """
+        raise NotImplementedError("set")
+
+    def delete(self, wk) -> None:
+        """ drop wrapped key if present """
+        raise NotImplementedError("delete")
+
+    def replace(self, evict_wks, wk, val) -> None:
+        """ drop evict_wks then store value under wk; the miss-with-eviction path """
+        for evict_wk in evict_wks:
+            self.delete(evict_wk)
+        self.set(wk, val)
+
+    def reset(self) -> None:
+        """ drop everything """
+        raise NotImplementedError("reset")
+
+
+def redis_decodes(scheme: CacheScheme) -> bool:
+    """ only "random" values are text; the other payloads are raw bytes,
+    which a decoding connection would fail to read back as utf-8 """
+    return scheme.payload == "random"
+
+
+class RedisStorage(Storage):
+    def __init__(self, scheme: CacheScheme) -> None:
+        import redis
+
+        self.name = "Redis"
+        self.scheme = scheme
+
+        # blocking pool: tenant threads wait for a free connection instead
+        # of failing when there are more threads than connections
+        self.pool = redis.BlockingConnectionPool(
+            host=scheme.redis_host, port=scheme.redis_port, db=scheme.redis_db,
+            max_connections=scheme.redis_pool_size, timeout=None,
+            decode_responses=redis_decodes(scheme))
+        self.redis = redis.Redis(connection_pool=self.pool)
+
+    def get(self, wk) -> Optional[str]:
+        return self.redis.get(wk)
+
+    def set(self, wk, val) -> None:
+        self.redis.set(wk, val)
+
+    def delete(self, wk) -> None:
+        self.redis.delete(wk)
+
+    def replace(self, evict_wks, wk, val) -> None:
+        # one round trip instead of two
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(*evict_wks)
+        pipe.set(wk, val)
+        pipe.execute()
+
+    def reset(self) -> None:
+        self.redis.flushdb()
+
+
+class DictStorage(Storage):
+    def __init__(self, scheme: CacheScheme) -> None:
+        self.name = "Dict"
+        self.scheme = scheme
+
+        self.data: Dict[str, str] = {}
+
+    def get(self, wk) -> Optional[str]:
+        return self.data.get(wk)
+
+    def set(self, wk, val) -> None:
+        self.data[wk] = val
+
+    def delete(self, wk) -> None:
+        self.data.pop(wk, None)
+
+    def reset(self) -> None:
+        self.data.clear()
+
+
+class MemoryStorage(DictStorage):
+    """ dict store that accounts key + value bytes against scheme.storage_bytes
+    and refuses writes beyond it, like redis with maxmemory and noeviction """
+
+    def __init__(self, scheme: CacheScheme) -> None:
+        super().__init__(scheme)
+        self.name = "Memory"
+
+        self.budget = scheme.storage_bytes
+        self.used_bytes = 0
+        self.peak_bytes = 0
+        # key stripes only order operations on one key; writes to different
+        # keys run concurrently and share the byte accounting
+        self.lock = threading.Lock()
+
+    def _entry_bytes(self, wk, val) -> int:
+        # size-only payload tokens stand for val_size bytes
+        return len(wk) + getattr(val, "val_size", len(val))
+
+    def set(self, wk, val) -> None:
+        with self.lock:
+            old = self.data.get(wk)
+            delta = self._entry_bytes(wk, val)
+            if old is not None:
+                delta -= self._entry_bytes(wk, old)
+            if self.budget is not None and self.used_bytes + delta > self.budget:
+                raise MemoryError(
+                    f"storage over budget: {self.used_bytes + delta} > {self.budget} bytes")
+            self.data[wk] = val
+            self.used_bytes += delta
+            self.peak_bytes = max(self.peak_bytes, self.used_bytes)
+
+    def delete(self, wk) -> None:
+        with self.lock:
+            old = self.data.pop(wk, None)
+            if old is not None:
+                self.used_bytes -= self._entry_bytes(wk, old)
+
+    def reset(self) -> None:
+        with self.lock:
+            super().reset()
+            self.used_bytes = 0
+
+
+STORAGES = {
+    "redis": RedisStorage,
+    "dict": DictStorage,
+    "memory": MemoryStorage,
+}
+
+
+def create_storage(cache_scheme: CacheScheme) -> Storage:
+    return STORAGES[cache_scheme.storage](scheme=cache_scheme)
+
+
+class AsyncStorage:
+    """ coroutine counterpart of Storage, for the asyncio replay """
+
+    async def get(self, wk) -> Optional[str]:
+        raise NotImplementedError("get")
+
+    async def set(self, wk, val) -> None:
+        raise NotImplementedError("set")
+
+    async def delete(self, wk) -> None:
+        raise NotImplementedError("delete")
+
+    async def replace(self, evict_wks, wk, val) -> None:
+        for evict_wk in evict_wks:
+            await self.delete(evict_wk)
+        await self.set(wk, val)
+
+    async def reset(self) -> None:
+        raise NotImplementedError("reset")
+
+
+class AsyncRedisStorage(AsyncStorage):
+    def __init__(self, scheme: CacheScheme) -> None:
+        import redis.asyncio
+
+        self.name = "AsyncRedis"
+        self.scheme = scheme
+
+        self.pool = redis.asyncio.BlockingConnectionPool(
+            host=scheme.redis_host, port=scheme.redis_port, db=scheme.redis_db,
+            max_connections=scheme.redis_pool_size, timeout=None,
+            decode_responses=redis_decodes(scheme))
+        self.redis = redis.asyncio.Redis(connection_pool=self.pool)
+
+    async def get(self, wk) -> Optional[str]:
+        return await self.redis.get(wk)
+
+    async def set(self, wk, val) -> None:
+        await self.redis.set(wk, val)
+
+    async def delete(self, wk) -> None:
+        await self.redis.delete(wk)
+
+    async def replace(self, evict_wks, wk, val) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(*evict_wks)
+            pipe.set(wk, val)
+            await pipe.execute()
+
+    async def reset(self) -> None:
+        await self.redis.flushdb()
+
+
+class AsyncLocalStorage(AsyncStorage):
+    """ in-process Storage behind the async interface; never yields """
+
+    def __init__(self, storage: Storage) -> None:
+        self.name = f"Async{storage.name}"
+        self.storage = storage
+
+    async def get(self, wk) -> Optional[str]:
+        return self.storage.get(wk)
+
+    async def set(self, wk, val) -> None:
+        self.storage.set(wk, val)
+
+    async def delete(self, wk) -> None:
+        self.storage.delete(wk)
+
+    async def replace(self, evict_wks, wk, val) -> None:
+        self.storage.replace(evict_wks, wk, val)
+
+    async def reset(self) -> None:
+        self.storage.reset()
+
+
+def create_async_storage(cache_scheme: CacheScheme) -> AsyncStorage:
+    if cache_scheme.storage == "redis":
+        return AsyncRedisStorage(scheme=cache_scheme)
+    return AsyncLocalStorage(create_storage(cache_scheme))
@@ -0,0 +1,53 @@
+import heapq
+import random
+from typing import List
+
+from tenant.tenant import Tenant, open_results, close_results
+from service.server import create_allocator
+from service.scheme import CacheScheme, BackingStoreScheme
+from service.lockstep import VirtualClock, LockstepReplay
+
+
+def merge_requests(tenants: List[Tenant]):
+    """ yield (ts, tenant index, query index) of all tenants in trace order """
+    streams = [zip(tnt.time_series, [n] * len(tnt.time_series), range(len(tnt.time_series)))
+               for n, tnt in enumerate(tenants)]
+    return heapq.merge(*streams)
+
+
+def simulate(tenants: List[Tenant], cache_scheme: CacheScheme, backingstore_scheme: BackingStoreScheme, seed=None):
+    """ replay all tenants in one event loop on a virtual clock;
+    requests issue exactly at their trace ts and take no service time,
+    misses finish after a backing store latency sampled in virtual time;
+    return the allocator """
+    clock = VirtualClock()
+    cache_scheme.clock = clock
+    allocator = create_allocator(cache_scheme)
+    rng = random.Random(seed)
+    for ts, n, i in merge_requests(tenants):
+        tnt = tenants[n]
+        clock.now = ts
+        hit, _, _ = allocator.access(tnt.tntid, tnt.query_keys[i], tnt.ttls[i],
+                                      tnt.val_sizes[i], tnt.ops[i] != "get")
+        add_latency = 0 if hit else backingstore_scheme.sample_latency(rng)
+        tnt.log.append(ts, ts + add_latency, hit)
+    return allocator
+
+
+def main(tenants: List[Tenant], cache_scheme: CacheScheme, backingstore_scheme: BackingStoreScheme, dst: str):
+    sink = open_results(tenants, dst)
+    allocator = simulate(tenants, cache_scheme, backingstore_scheme)
+    close_results(tenants, sink)
+    print("reclaimed by ttl:", dict(allocator.reclaimed))
+    allocator.save_metrics(dst)
+
+
+def lockstep(tenants: List[Tenant], cache_scheme: CacheScheme, allocator_classes: List[type],
+             backingstore_scheme: BackingStoreScheme, seed=None) -> LockstepReplay:
+    """ replay all tenants once through every allocator class in lockstep;
+    the replay's frames() maps allocator class -> result frame """
+    replay = LockstepReplay(cache_scheme, allocator_classes, backingstore_scheme, seed)
+    replay.run((ts, tenants[n].tntid, tenants[n].query_keys[i], tenants[n].ttls[i], tenants[n].val_sizes[i],
+                tenants[n].ops[i] != "get")
+               for ts, n, i in merge_requests(tenants))
+    return replay
@@ -0,0 +1,102 @@
+import os
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+from main import run_experiment, get_result_path
+from tenant.trace import Trace, load_trace
+from service.allocator.global_pooled_lru import GlobalPooledLRU
+from service.allocator.maxmin import Maxmin
+from service.allocator.amshare import AMShare
+from service.allocator.memshare import Memshare
+
+# per-process trace cache; filled in the parent before the pool forks,
+# reloaded from the npz sidecar by workers that were spawned instead
+_traces: Dict[str, Trace] = {}
+_wrapped_keys: Dict[str, List[str]] = {}
+_scheme_overrides: Dict = {}
+
+
+def _get_trace(trace_file):
+    if trace_file not in _traces:
+        _traces[trace_file] = load_trace(trace_file)
+        _wrapped_keys[trace_file] = _traces[trace_file].wrapped_keys()
+    return _traces[trace_file], _wrapped_keys[trace_file]
+
+
+def _init_worker(storage, redis_dbs) -> None:
+    """ give each worker its own storage: an in-process backend,
+    or a redis db index of its own """
+    _scheme_overrides["storage"] = storage
+    if storage == "redis":
+        _scheme_overrides["redis_db"] = redis_dbs.get()
+
+
+def _run(run: Dict) -> str:
+    trace, wrapped_keys = _get_trace(run["trace_file"])
+    return run_experiment(trace, run["trace_file"], run["latency_mu"], run["latency_sigma"],
+                          run["cache_ratio"], run["allocator_class"], replay=run["replay"],
+                          wrapped_keys=wrapped_keys, scheme_overrides=_scheme_overrides,
+                          capacity=run.get("capacity", "objects"))
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    """ {"param": [values]} -> one dict per combination """
+    names = list(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[grid[n] for n in names])]
+
+
+def sweep(grid: Dict[str, List], max_workers=None, storage="dict", redis_db_base=1, skip_done=True) -> List[str]:
+    """ run every combination of grid in a process pool;
+    grid keys: trace_file, latency_mu, latency_sigma, cache_ratio,
+    allocator_class, replay, and optionally capacity. runs whose result
+    csv exists are skipped; a grid giving two runs one result path is
+    rejected, as they would overwrite each other """
+    runs = []
+    dsts: Dict[str, Dict] = {}
+    for run in expand_grid(grid):
+        dst = get_result_path(run["trace_file"], run["latency_mu"],
+                              run["cache_ratio"], run["allocator_class"],
+                              run.get("capacity", "objects"),
+                              run["latency_sigma"], run["replay"])
+        if dst in dsts:
+            raise ValueError(f"runs {dsts[dst]} and {run} both write {dst}")
+        dsts[dst] = run
+        if skip_done and os.path.exists(dst):
+            print("skip", dst)
+            continue
+        runs.append(run)
+    if not runs:
+        return []
+
+    for trace_file in set(run["trace_file"] for run in runs):
+        _get_trace(trace_file)
+
+    max_workers = min(max_workers or os.cpu_count(), len(runs))
+    done = []
+    with mp.Manager() as manager:
+        redis_dbs = manager.Queue()
+        for i in range(max_workers):
+            redis_dbs.put(redis_db_base + i)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(storage, redis_dbs)) as pool:
+            futures = {pool.submit(_run, run): run for run in runs}
+            for future in as_completed(futures):
+                dst = future.result()
+                print("done", dst)
+                done.append(dst)
+    return done
+
+
+if __name__ == "__main__":
+    grid = {
+        "trace_file": ["data/trace/selected_data_tenant2_time0-900_iter1.csv"],
+        "latency_mu": [3],
+        "latency_sigma": [0],
+        "cache_ratio": [0.05, 0.1, 0.2, 0.3, 0.5],
+        "allocator_class": [GlobalPooledLRU, Maxmin, AMShare, Memshare],
+        "replay": ["sim"],
+    }
+    sweep(grid)
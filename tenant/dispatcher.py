@@ -0,0 +1,87 @@
+import time
+import heapq
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from tenant.tenant import Tenant
+from service.server import CacheServer
+
+
+class Dispatcher:
+    """ replays all tenants from one thread: a heap holds each tenant's next
+    due query, the dispatcher sleeps until the earliest is due and hands it
+    to a bounded worker pool. a tenant's next query is only queued once its
+    previous one returned, so each tenant stays sequential as before """
+
+    def __init__(self, tenants: List[Tenant], cache_svr: CacheServer, num_workers) -> None:
+        self.tenants = tenants
+        self.cache_svr = cache_svr
+        self.num_workers = num_workers
+
+        self.cond = threading.Condition()
+        self.heap: List[Tuple[float, int, int]] = []  # (ts, tenant index, query index)
+        self.inflight = 0
+        self.error = None
+
+        offsets = np.cumsum([0] + [len(tnt.time_series) for tnt in tenants])
+        self.lag_offsets = offsets[:-1]
+        self.lags = np.zeros(offsets[-1], dtype=np.float64)  # issue_ts - original_ts
+
+    def _push(self, n, i) -> None:
+        if i < len(self.tenants[n].time_series):
+            heapq.heappush(self.heap, (self.tenants[n].time_series[i], n, i))
+
+    def _issue(self, n, i, t0) -> None:
+        try:
+            tnt = self.tenants[n]
+            t = tnt.issue(self.cache_svr, i, t0)
+            self.lags[self.lag_offsets[n] + i] = t - tnt.time_series[i]
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self.cond:
+                self.inflight -= 1
+                if self.error is None:
+                    self._push(n, i + 1)
+                self.cond.notify()
+
+    def _next_due(self, t0):
+        """ block until a query is due; None once all are done """
+        with self.cond:
+            while True:
+                if self.error is not None:
+                    raise self.error
+                if not self.heap:
+                    if self.inflight == 0:
+                        return None
+                    self.cond.wait()
+                    continue
+                wait = t0 + self.heap[0][0] - time.time()
+                if wait <= 0:
+                    _, n, i = heapq.heappop(self.heap)
+                    self.inflight += 1
+                    return n, i
+                self.cond.wait(wait)
+
+    def run(self, t0: float) -> None:
+        for n in range(len(self.tenants)):
+            self._push(n, 0)
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            while True:
+                due = self._next_due(t0)
+                if due is None:
+                    break
+                pool.submit(self._issue, *due, t0)
+
+    def lag_summary(self) -> Dict[str, float]:
+        """ how late queries were issued relative to their trace ts, seconds """
+        if not len(self.lags):
+            return {}
+        return {
+            "mean": float(self.lags.mean()),
+            "p50": float(np.percentile(self.lags, 50)),
+            "p99": float(np.percentile(self.lags, 99)),
+            "max": float(self.lags.max()),
+        }
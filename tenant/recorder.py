@@ -0,0 +1,95 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+
+class ResultSink:
+    """ one result file written in chunks as they come; csv, or parquet
+    when dst ends with .parquet (needs pyarrow). chunks go to dst.tmp,
+    which only becomes dst on close, so an interrupted run leaves no
+    truncated dst for a resumed sweep to mistake for a finished one """
+
+    def __init__(self, dst: str) -> None:
+        self.dst = dst
+        self.tmp = dst + ".tmp"
+        self.lock = threading.Lock()  # tenant threads flush concurrently
+        self.file = None
+        self.writer = None
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+    def write(self, df: pd.DataFrame) -> None:
+        with self.lock:
+            if self.dst.endswith(".parquet"):
+                self._write_parquet(df)
+            elif self.file is None:
+                self.file = open(self.tmp, "w", newline="")
+                df.to_csv(self.file, index=False)
+            else:
+                df.to_csv(self.file, index=False, header=False)
+
+    def _write_parquet(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.tmp, table.schema)
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is None and self.writer is None:
+                return
+            if self.file is not None:
+                self.file.close()
+            if self.writer is not None:
+                self.writer.close()
+            os.replace(self.tmp, self.dst)
+            self.file = self.writer = None
+
+
+class TenantLog:
+    """ issue/finish/hit of one tenant in preallocated typed arrays; with a
+    sink, the arrays hold one chunk and are flushed and reused when full """
+
+    def __init__(self, tntid, time_series, capacity, sink: ResultSink = None) -> None:
+        self.tntid = tntid
+        self.time_series = time_series
+        self.sink = sink
+
+        capacity = max(1, capacity)
+        self.issue = np.empty(capacity, dtype=np.float64)
+        self.finish = np.empty(capacity, dtype=np.float64)
+        self.hit = np.empty(capacity, dtype=np.bool_)
+        self.n = 0  # rows in buffer
+        self.base = 0  # rows flushed before buffer
+
+    def __len__(self) -> int:
+        return self.base + self.n
+
+    def append(self, issue, finish, hit) -> None:
+        if self.n == len(self.issue):
+            self.flush()
+        self.issue[self.n] = issue
+        self.finish[self.n] = finish
+        self.hit[self.n] = hit
+        self.n += 1
+
+    def frame(self) -> pd.DataFrame:
+        """ rows still in buffer """
+        return pd.DataFrame({
+            "tntid": np.full(self.n, self.tntid),
+            "original_ts": self.time_series[self.base:self.base + self.n],
+            "issue_ts": self.issue[:self.n],
+            "finish_ts": self.finish[:self.n],
+            "hit": self.hit[:self.n],
+        })
+
+    def flush(self, sink: ResultSink = None) -> None:
+        sink = sink or self.sink
+        assert sink is not None, "full log without a sink"
+        if self.n:
+            sink.write(self.frame())
+        self.base += self.n
+        self.n = 0
@@ -1,9 +1,10 @@
 import time
 import json
-import pandas as pd
 from typing import List
 
-from service.server import CacheServer
+import config
+from service.server import CacheServer, AsyncCacheServer
+from tenant.recorder import ResultSink, TenantLog
 
 
 class Tenant:
@@ -15,38 +16,51 @@ class Tenant:
         self.ops: List[str] = ops
         self.ttls: List[int] = ttls
 
-        self.log_issue: List[float] = []
-        self.log_finish: List[float] = []
-        self.log_hit: List[bool] = []
+        self.log: TenantLog = None  # set by open_results
         assert len(time_series) == len(query_keys)
 
-    def run(self, cache_svr: CacheServer, t0: float):
-        last_finish = 0
-        i = 0
-        while i < len(self.time_series):
-            t = time.time() - t0
-            # if t >= self.time_series[i] and t >= last_finish:
-            if t >= self.time_series[i]:
-                print(f"tenant {self.tntid}: {i+1}/{len(self.query_keys)}")
-                hit, add_latency = cache_svr.request(tntid=self.tntid,
-                                                     key=self.query_keys[i],
-                                                     iswrite=self.ops[i] != "get",
-                                                     val_size=self.val_sizes[i],
-                                                     ttl=self.ttls[i]
-                                                     )
-                last_finish = time.time() - t0 + add_latency
-
-                self.log_issue.append(t)
-                self.log_finish.append(last_finish)
-                self.log_hit.append(hit)
-                i += 1
-
-    def dump_result(self):
-        data = {
-            "tntid": [self.tntid] * len(self.time_series),
-            "original_ts": self.time_series,
-            "issue_ts": self.log_issue,
-            "finish_ts": self.log_finish,
-            "hit": self.log_hit,
-        }
-        return pd.DataFrame(data)
+    def issue(self, cache_svr: CacheServer, i: int, t0: float) -> float:
+        """ issue query i now and log it; return its issue ts """
+        t = time.time() - t0
+        hit, add_latency = cache_svr.request(tntid=self.tntid,
+                                             key=self.query_keys[i],
+                                             iswrite=self.ops[i] != "get",
+                                             val_size=self.val_sizes[i],
+                                             ttl=self.ttls[i]
+                                             )
+        last_finish = time.time() - t0 + add_latency
+
+        self.log.append(t, last_finish, hit)
+        return t
+
+    async def arun(self, cache_svr: AsyncCacheServer, loop, t0: float):
+        """ coroutine replay; t0 is loop.time() at trace start """
+        for i in range(len(self.time_series)):
+            due = loop.create_future()
+            loop.call_at(t0 + self.time_series[i], due.set_result, None)
+            await due
+            t = loop.time() - t0
+            hit, add_latency = await cache_svr.request(tntid=self.tntid,
+                                                       key=self.query_keys[i],
+                                                       iswrite=self.ops[i] != "get",
+                                                       val_size=self.val_sizes[i],
+                                                       ttl=self.ttls[i]
+                                                       )
+            last_finish = loop.time() - t0 + add_latency
+
+            self.log.append(t, last_finish, hit)
+
+
+def open_results(tenants: List[Tenant], dst: str, chunk_rows=config.RESULT_CHUNK_ROWS) -> ResultSink:
+    """ stream tenants' results to dst in chunks of chunk_rows while running """
+    sink = ResultSink(dst)
+    for tnt in tenants:
+        tnt.log = TenantLog(tnt.tntid, tnt.time_series,
+                            min(len(tnt.time_series), chunk_rows), sink)
+    return sink
+
+
+def close_results(tenants: List[Tenant], sink: ResultSink):
+    for tnt in tenants:
+        tnt.log.flush(sink)
+    sink.close()
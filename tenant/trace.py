@@ -0,0 +1,116 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import List
+
+from tenant.tenant import Tenant
+
+
+class Trace:
+    """ trace columns as typed arrays, rows grouped by tenant (in order of
+    first appearance) and sorted by ts within each tenant """
+
+    COLUMNS = ["ts", "tntids", "key_ids", "keys", "val_sizes", "ops", "ttls",
+               "tnt_starts"]
+
+    def __init__(self, ts, tntids, key_ids, keys, val_sizes, ops, ttls, tnt_starts) -> None:
+        self.ts: np.ndarray = ts  # float64
+        self.tntids: np.ndarray = tntids  # int64, one per tenant
+        self.key_ids: np.ndarray = key_ids  # int32 into keys
+        self.keys: np.ndarray = keys  # unique key strings
+        self.val_sizes: np.ndarray = val_sizes  # int64
+        self.ops: np.ndarray = ops  # fixed width str
+        self.ttls: np.ndarray = ttls  # int64
+        self.tnt_starts: np.ndarray = tnt_starts  # row offsets, len(tntids)+1
+        self._intern()
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def _intern(self) -> None:
+        """ number (tntid, key) pairs densely: pair_ids per row, and
+        pair_tnt_idx / pair_key_ids mapping each id back """
+        tnt_idx = np.repeat(np.arange(len(self.tntids), dtype=np.int64),
+                            np.diff(self.tnt_starts))
+        pairs, pair_ids = np.unique(tnt_idx * len(self.keys) + self.key_ids,
+                                    return_inverse=True)
+        self.pair_ids: np.ndarray = pair_ids.astype(np.int64)
+        self.pair_tnt_idx: np.ndarray = pairs // max(1, len(self.keys))
+        self.pair_key_ids: np.ndarray = pairs % max(1, len(self.keys))
+
+    def num_unique_keys(self) -> int:
+        """ number of distinct (tntid, key) pairs """
+        return len(self.pair_key_ids)
+
+    def pair_sizes(self) -> np.ndarray:
+        """ largest val_size each pair id is requested with """
+        sizes = np.zeros(len(self.pair_key_ids), dtype=np.int64)
+        np.maximum.at(sizes, self.pair_ids, self.val_sizes)
+        return sizes
+
+    def wrapped_keys(self) -> List[str]:
+        """ storage key of every pair id, as CacheClient would wrap it """
+        return [f"{self.tntids[t]}:{self.keys[k]}"
+                for t, k in zip(self.pair_tnt_idx, self.pair_key_ids)]
+
+    def tenants(self, interned=True) -> List[Tenant]:
+        """ fresh Tenants over views of the trace columns; query keys are
+        pair ids when interned, else the key strings """
+        tenants: List[Tenant] = []
+        for i, tntid in enumerate(self.tntids):
+            sl = slice(self.tnt_starts[i], self.tnt_starts[i+1])
+            keys = self.pair_ids[sl] if interned else self.keys[self.key_ids[sl]]
+            tnt = Tenant(tntid=int(tntid), time_series=self.ts[sl],
+                         query_keys=keys,
+                         val_sizes=self.val_sizes[sl], ops=self.ops[sl],
+                         ttls=self.ttls[sl])
+            tenants.append(tnt)
+        return tenants
+
+    def save(self, path: str) -> None:
+        np.savez(path, **{c: getattr(self, c) for c in self.COLUMNS})
+
+    @classmethod
+    def load(cls, path: str) -> "Trace":
+        with np.load(path) as f:
+            return cls(**{c: f[c] for c in cls.COLUMNS})
+
+    @classmethod
+    def from_df(cls, df) -> "Trace":
+        tntid = df["tntid"].to_numpy(dtype=np.int64)
+        ts = df["ts"].to_numpy(dtype=np.float64)
+        key_ids, keys = pd.factorize(df["key"].astype(str))
+
+        # tenants in order of first appearance, rows by ts (stable) within
+        uniq, first = np.unique(tntid, return_index=True)
+        tnt_rank = np.empty(len(uniq), dtype=np.int64)
+        tnt_rank[np.argsort(first, kind="stable")] = np.arange(len(uniq))
+        rank = tnt_rank[np.searchsorted(uniq, tntid)]
+        order = np.lexsort((ts, rank))
+
+        counts = np.bincount(rank, minlength=len(uniq))
+        tnt_starts = np.zeros(len(uniq) + 1, dtype=np.int64)
+        np.cumsum(counts, out=tnt_starts[1:])
+        return cls(ts=ts[order],
+                   tntids=uniq[np.argsort(tnt_rank)],
+                   key_ids=key_ids[order].astype(np.int32),
+                   keys=np.asarray(keys, dtype=str),
+                   val_sizes=df["val_size"].to_numpy(dtype=np.int64)[order],
+                   ops=df["op"].to_numpy(dtype=str)[order],
+                   ttls=df["ttl"].to_numpy(dtype=np.int64)[order],
+                   tnt_starts=tnt_starts)
+
+
+def sidecar_path(trace_file: str) -> str:
+    return os.path.splitext(trace_file)[0] + ".npz"
+
+
+def load_trace(trace_file: str) -> Trace:
+    """ load trace csv through its .npz sidecar, (re)writing the sidecar
+    when missing or older than the csv """
+    npz = sidecar_path(trace_file)
+    if os.path.exists(npz) and os.path.getmtime(npz) >= os.path.getmtime(trace_file):
+        return Trace.load(npz)
+    trace = Trace.from_df(pd.read_csv(trace_file))
+    trace.save(npz)
+    return trace
@@ -0,0 +1,132 @@
+import random
+
+import pytest
+
+from service.scheme import CacheScheme
+from service.lockstep import VirtualClock
+from service.allocator.global_pooled_lru import GlobalPooledLRU
+from service.allocator.maxmin import Maxmin
+from service.allocator.amshare import AMShare
+from service.allocator.memshare import Memshare
+from service.allocator.slabshare import SlabShare
+
+ALLOCATORS = [GlobalPooledLRU, Maxmin, AMShare, Memshare, SlabShare]
+
+
+def make_allocator(allocator_class, cache_size=100, num_tenants=2, capacity="objects", num_keys=None):
+    scheme = CacheScheme(cache_ratio=None, cache_size=cache_size,
+                         num_tenants=num_tenants, allocator_class=allocator_class)
+    scheme.capacity = capacity
+    scheme.num_keys = num_keys
+    scheme.clock = VirtualClock()
+    return allocator_class(scheme=scheme)
+
+
+def at(allocator, now, *request, iswrite=False):
+    allocator.scheme.clock.now = now
+    return allocator.access(*request, iswrite=iswrite)
+
+
+@pytest.mark.parametrize("allocator_class", ALLOCATORS)
+def test_set_again_restarts_ttl(allocator_class):
+    a = make_allocator(allocator_class)
+    at(a, 0, 0, "k", 240, 100, iswrite=True)
+    hit, _, expired = at(a, 200, 0, "k", 240, 100, iswrite=True)
+    assert hit and not expired
+    # past the first deadline (240), before the second (440)
+    hit, _, expired = at(a, 300, 0, "k", 0, 100)
+    assert hit and not expired
+    assert not a.reclaimed
+    hit, _, expired = at(a, 450, 0, "k", 0, 100)
+    assert not hit and expired == [(0, "k")]
+
+
+@pytest.mark.parametrize("allocator_class", ALLOCATORS)
+def test_read_hit_keeps_ttl(allocator_class):
+    a = make_allocator(allocator_class)
+    at(a, 0, 0, "k", 240, 100, iswrite=True)
+    at(a, 200, 0, "k", 240, 100)
+    hit, _, expired = at(a, 300, 0, "k", 0, 100)
+    assert not hit and expired == [(0, "k")]
+
+
+@pytest.mark.parametrize("allocator_class", ALLOCATORS)
+def test_set_again_without_ttl_never_expires(allocator_class):
+    a = make_allocator(allocator_class)
+    at(a, 0, 0, "k", 240, 100, iswrite=True)
+    at(a, 200, 0, "k", 0, 100, iswrite=True)
+    hit, _, expired = at(a, 10_000, 0, "k", 0, 100)
+    assert hit and not expired
+
+
+def held(a):
+    """ per-tenant sum of the sizes of live entries """
+    used = {}
+    for tntid, _, slot in a.entries.items():
+        used[tntid] = used.get(tntid, 0) + a.entries.size[slot]
+    return used
+
+
+def assert_accounting(a):
+    used = held(a)
+    assert {t: u for t, u in a.tenant_usage().items() if u} == {t: u for t, u in used.items() if u}
+    assert a.cache_used == sum(used.values()) <= a.scheme.cache_size
+
+
+@pytest.mark.parametrize("capacity", ["bytes", "slabs"])
+@pytest.mark.parametrize("allocator_class", ALLOCATORS)
+def test_set_again_recharges(allocator_class, capacity):
+    a = make_allocator(allocator_class, cache_size=10_000, capacity=capacity)
+    for i in range(8):
+        at(a, i, i % 2, i, 0, 1000, iswrite=True)
+    assert_accounting(a)
+
+    # larger: the key is charged its new size and others are evicted for it
+    hit, evicted, _ = at(a, 10, 0, 0, 0, 4000, iswrite=True)
+    assert hit and evicted and (0, 0) not in evicted
+    assert a.entries.size[a.get_entry(0, 0)] == a._charge(4000)
+    assert_accounting(a)
+
+    # smaller: the charge drops and nothing is evicted
+    hit, evicted, _ = at(a, 11, 0, 0, 0, 100, iswrite=True)
+    assert hit and not evicted
+    assert a.entries.size[a.get_entry(0, 0)] == a._charge(100)
+    assert_accounting(a)
+
+    # a read hit keeps the charge of the last set
+    at(a, 12, 0, 0, 0, 4000)
+    assert a.entries.size[a.get_entry(0, 0)] == a._charge(100)
+
+    # too large for the whole cache: the key leaves
+    hit, evicted, _ = at(a, 13, 0, 0, 0, 20_000, iswrite=True)
+    assert hit and evicted == [(0, 0)] and a.get_entry(0, 0) is None
+    assert_accounting(a)
+
+
+def test_slabshare_set_again_moves_slab_class():
+    a = make_allocator(SlabShare, cache_size=10_000, capacity="slabs")
+    at(a, 0, 0, "k", 0, 100, iswrite=True)
+    small = a.entries.status[a.get_entry(0, "k")]
+    at(a, 1, 0, "k", 0, 3000, iswrite=True)
+    big = a.entries.status[a.get_entry(0, "k")]
+    assert big != small
+    assert a.cache[0][small].cache_cnt == 0 and a.cache[0][big].cache_cnt == 1
+    assert a.cache[0][big].used == a._charge(3000)
+
+
+@pytest.mark.parametrize("capacity", ["objects", "bytes"])
+@pytest.mark.parametrize("allocator_class", ALLOCATORS)
+def test_dense_entry_store_matches_dict_store(allocator_class, capacity):
+    # keys are pair ids, tenant * 100 + key, as Trace interns them
+    cache_size = 50 if capacity == "objects" else 50 * 1000
+    dense = make_allocator(allocator_class, cache_size, 4, capacity, num_keys=400)
+    sparse = make_allocator(allocator_class, cache_size, 4, capacity)
+    rng = random.Random(0)
+    for i in range(5000):
+        t = rng.randrange(4)
+        request = (t, t * 100 + int(rng.paretovariate(0.8)) % 100,
+                   rng.choice([0, 0, 2]), rng.choice([100, 1000, 4000]))
+        iswrite = rng.random() < 0.3
+        assert at(dense, i * 0.1, *request, iswrite=iswrite) == at(sparse, i * 0.1, *request, iswrite=iswrite)
+    assert sorted(dense.entries.items()) == sorted(sparse.entries.items())
+    assert_accounting(dense)
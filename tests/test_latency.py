@@ -0,0 +1,17 @@
+import random
+
+from service.latency import LogHistogram
+
+
+def test_percentiles_within_one_sub_bucket():
+    rng = random.Random(0)
+    values = sorted(int(rng.lognormvariate(10, 2)) for _ in range(20_000))
+    h = LogHistogram()
+    for v in values:
+        h.record(v)
+    assert h.half == 32  # sub-buckets per power of two
+    for q in (50, 90, 99, 99.9):
+        exact = values[max(0, int(-(-len(values) * q // 100)) - 1)]
+        # reports the lowest value of the bucket holding the percentile
+        assert exact / (1 + 1 / h.half) <= h.percentile(q) <= exact
+    assert h.max == values[-1] and h.total == len(values)
@@ -0,0 +1,28 @@
+import sys
+import threading
+
+from service.scheme import CacheScheme
+from service.storage import MemoryStorage
+
+
+def test_concurrent_writes_keep_byte_accounting():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often to expose races
+    try:
+        scheme = CacheScheme(cache_ratio=None, cache_size=10, num_tenants=1, allocator_class=None)
+        storage = MemoryStorage(scheme)
+
+        def work(t):
+            for i in range(10_000):
+                storage.set(f"{t}:{i % 50}", "x" * (i % 7 + 1))
+                if i % 3 == 0:
+                    storage.delete(f"{t}:{(i + 25) % 50}")
+
+        threads = [threading.Thread(target=work, args=(t,)) for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert storage.used_bytes == sum(len(wk) + len(val) for wk, val in storage.data.items())
@@ -0,0 +1,22 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from tenant.recorder import ResultSink, TenantLog
+
+
+def test_result_appears_only_on_close(tmp_path):
+    dst = str(tmp_path / "results" / "run.csv")
+    sink = ResultSink(dst)
+    log = TenantLog(0, np.arange(5, dtype=np.float64), capacity=2, sink=sink)
+    for i in range(5):
+        log.append(i, i + 0.5, i % 2 == 0)
+    log.flush()
+    assert not os.path.exists(dst)  # an interrupted run leaves only dst.tmp
+
+    sink.close()
+    assert not os.path.exists(dst + ".tmp")
+    df = pd.read_csv(dst)
+    assert list(df["issue_ts"]) == [0, 1, 2, 3, 4]
+    assert list(df["hit"]) == [True, False, True, False, True]
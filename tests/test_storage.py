@@ -0,0 +1,50 @@
+import socket
+
+import pytest
+
+from service.scheme import CacheScheme
+from service.payload import PAYLOADS, create_payload
+
+redis = pytest.importorskip("redis")
+
+from service.storage import RedisStorage, AsyncRedisStorage  # noqa: E402
+
+
+def make_scheme(payload) -> CacheScheme:
+    scheme = CacheScheme(cache_ratio=None, cache_size=10, num_tenants=1, allocator_class=None)
+    scheme.payload = payload
+    scheme.payload_buffer_bytes = 1 << 16
+    return scheme
+
+
+@pytest.mark.parametrize("payload", list(PAYLOADS))
+@pytest.mark.parametrize("storage_class", [RedisStorage, AsyncRedisStorage])
+def test_set_then_get_decodes(storage_class, payload):
+    """ a value goes out through the pool's encoder and a GET reply comes
+    back through the same encoder, as redis-py does on the wire """
+    scheme = make_scheme(payload)
+    encoder = storage_class(scheme).pool.get_encoder()
+    for size in (1, 100, 4096):
+        val = create_payload(scheme).get(size)
+        reply = bytes(encoder.encode(val))
+        assert encoder.decode(reply) == (val if isinstance(val, str) else bytes(val))
+
+
+def _redis_server(scheme):
+    try:
+        socket.create_connection((scheme.redis_host, scheme.redis_port), timeout=0.5).close()
+    except OSError:
+        pytest.skip("no redis server")
+
+
+@pytest.mark.parametrize("payload", list(PAYLOADS))
+def test_set_then_get_on_server(payload):
+    scheme = make_scheme(payload)
+    _redis_server(scheme)
+    storage = RedisStorage(scheme)
+    val = create_payload(scheme).get(4096)
+    storage.set("test_set_then_get", val)
+    try:
+        assert storage.get("test_set_then_get") == (val if isinstance(val, str) else bytes(val))
+    finally:
+        storage.delete("test_set_then_get")
@@ -0,0 +1,27 @@
+import pytest
+
+from sweep import expand_grid, sweep
+from main import get_result_path
+from service.allocator.maxmin import Maxmin
+
+GRID = {
+    "trace_file": ["data/trace/t.csv"],
+    "latency_mu": [3],
+    "latency_sigma": [0, 1],
+    "cache_ratio": [0.5],
+    "allocator_class": [Maxmin],
+    "replay": ["threads", "sim"],
+}
+
+
+def test_result_path_per_run():
+    dsts = {get_result_path(run["trace_file"], run["latency_mu"], run["cache_ratio"],
+                            run["allocator_class"], "objects", run["latency_sigma"], run["replay"])
+            for run in expand_grid(GRID)}
+    assert len(dsts) == 4
+    assert "results/lat3_cr0.5/t_Maxmin.csv" in dsts
+
+
+def test_sweep_rejects_shared_result_path():
+    with pytest.raises(ValueError):
+        sweep(dict(GRID, replay=["sim", "sim"]))